@@ -1,40 +1,296 @@
-import argparse, sys, glob
-from .parser import parse as parse_bv, parse_type
+import argparse, sys, os, glob, time, traceback
+from .parser import parse_files, parse_type
 from .ast import print_value
-from .gen_verilog import gen_verilog
-from .sema import sema, Context
+from .gen_verilog import gen_verilog, gen_verilog_files, module_template, ModuleFiles
+from .sema import sema, update, Context
+from .cache import DiskCache, MemoryCache
+from .lexer import ParseError
+from .index import DeclIndex
 
-def main(args=None, stdout=sys.stdout):
-    p = argparse.ArgumentParser()
-    p.add_argument('-m', '--module')
+def _glob(pattern):
+    try:
+        return glob.iglob(pattern, recursive=True)
+    except TypeError:
+        return glob.iglob(pattern)
+
+def _read_file_list(fname):
+    # One path or glob per line, relative to the list's directory;
+    # blank lines and lines starting with '#' are ignored.
+    base = os.path.dirname(fname)
+    r = []
+    with open(fname, 'r') as fin:
+        for line in fin:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                r.append(os.path.join(base, line))
+    return r
+
+def _expand_globs(globs):
+    # Only names are collected here; each file is opened, read in one go
+    # and closed again by the parser or the index, so the number of open
+    # handles does not depend on the number of inputs.
+    r = []
+    seen = set()
+    for input_glob in globs:
+        inputs = sorted(_glob(input_glob))
+        if not inputs:
+            raise RuntimeError('not found: ' + input_glob)
+        for fname in inputs:
+            key = os.path.normcase(os.path.abspath(fname))
+            if key not in seen:
+                seen.add(key)
+                r.append(fname)
+    return r
+
+def _make_escape(fname):
+    return fname.replace('$', '$$').replace('#', '\\#').replace(' ', '\\ ')
+
+def _write_depfile(fname, target, deps):
+    with open(fname, 'w') as fout:
+        fout.write('{}:'.format(_make_escape(target)))
+        for dep in deps:
+            fout.write(' \\\n  {}'.format(_make_escape(dep)))
+        fout.write('\n')
+
+def _resolve_paths(args, cwd):
+    # Joins the relative paths and globs of `args` to `cwd`. The target
+    # of the depfile is a name for the build tool and is kept as given.
+    pattern_dir = glob.escape(cwd) if hasattr(glob, 'escape') else cwd
+    args.input = [os.path.join(pattern_dir, pattern) for pattern in args.input]
+    args.library = [os.path.join(pattern_dir, pattern) for pattern in args.library]
+    args.file_list = [os.path.join(cwd, fname) for fname in args.file_list]
+    for attr in ('out_dir', 'depfile', 'cache_dir'):
+        if getattr(args, attr):
+            setattr(args, attr, os.path.join(cwd, getattr(args, attr)))
+
+def main(args=None, stdout=sys.stdout, caches=None, cwd=None):
+    """
+    Runs the translator with the command-line arguments `args`. Unless
+    --cache-dir is given, `caches` may hold a pair of caches for parsed
+    files and generated modules that outlive the call, as the compile
+    server's do. Relative paths in `args` are taken relative to `cwd`
+    if it is given.
+    """
+    p = argparse.ArgumentParser(prog='bv')
+    p.add_argument('-m', '--module', action='append', default=[],
+        help='module to elaborate, optionally with arguments as in "fifo(4, 8)"; may be repeated')
     p.add_argument('--print-ast', action='store_true')
-    p.add_argument('input', nargs='+')
+    p.add_argument('--cache-dir', default=os.environ.get('BV_CACHE_DIR'),
+        help='directory in which parsed files and generated modules are cached (default: $BV_CACHE_DIR)')
+    p.add_argument('--cache-size', type=int, default=256,
+        help='maximum size of the cache in MiB')
+    p.add_argument('--cache-stats', action='store_true',
+        help='print cache hits and misses and the number of shared elaborated nodes to stderr')
+    p.add_argument('-j', '--jobs', type=int, default=1,
+        help='number of processes parsing the inputs and generating Verilog (0 for one per CPU)')
+    p.add_argument('--split', action='store_true',
+        help='with --jobs, parse the top-level declarations of each file in parallel')
+    p.add_argument('-L', '--library', action='append', default=[],
+        help='library files whose declarations are only parsed when used')
+    p.add_argument('-f', '--file-list', action='append', default=[],
+        help='file listing input paths or globs, one per line')
+    p.add_argument('--stream', action='store_true',
+        help='write each module as soon as it is elaborated and release its body; '
+            'submodules are written before the modules that instantiate them')
+    p.add_argument('-o', '--out-dir',
+        help='write each module to its own file in this directory, along with a files.f '
+            'listing them; files whose content does not change are not rewritten')
+    p.add_argument('-MD', '--depfile',
+        help='write a make-style depfile listing the input files and the library files that the elaboration used')
+    p.add_argument('-MT', '--dep-target',
+        help='the target of the depfile (default: files.f in the --out-dir)')
+    p.add_argument('--watch', action='store_true',
+        help='keep running and rebuild the --out-dir whenever an input file changes')
+    p.add_argument('--watch-interval', type=float, default=0.2,
+        help='seconds between checks for changed files in --watch mode')
+    p.add_argument('input', nargs='*')
     args = p.parse_args(args=args)
 
-    new_inputs = []
-    for input_glob in args.input:
-        inputs = [open(fname, 'r') for fname in glob.iglob(input_glob)]
-        if not inputs:
-            print>>sys.stderr, 'error: not found: {}'.format(input_glob)
-            sys.exit(2)
-        new_inputs.extend(inputs)
-    args.input = new_inputs
+    input_globs = args.input
+    library_globs = args.library
+    if not args.input and not args.file_list:
+        p.error('no input files')
+    if args.depfile and not args.dep_target:
+        if not args.out_dir:
+            p.error('--depfile requires --dep-target or --out-dir')
+        args.dep_target = os.path.join(args.out_dir, 'files.f')
+    if cwd is not None:
+        _resolve_paths(args, cwd)
+    try:
+        _find_inputs(args, input_globs, library_globs)
+    except RuntimeError as e:
+        sys.stderr.write('error: {}\n'.format(e))
+        return 2
+    if not args.input:
+        p.error('no input files')
+
+    cache = None
+    module_cache = None
+    if args.cache_dir:
+        # Parsed files and generated modules share the directory and its
+        # size limit.
+        cache = DiskCache(args.cache_dir, max_size=args.cache_size << 20)
+        module_cache = cache
+    elif caches is not None:
+        cache, module_cache = caches
+
+    if args.watch:
+        if caches is not None:
+            p.error('--watch cannot be used with the compile server')
+        if not args.out_dir:
+            p.error('--watch requires --out-dir')
+        return _watch(args, stdout, cache, input_globs, library_globs)
+
+    files = None
+    if args.out_dir:
+        files = ModuleFiles(args.out_dir)
+    ctx = _build(args, stdout, cache, module_cache, files)
 
-    units = [parse_bv(input) for input in args.input]
+    if args.cache_stats:
+        _write_stats(ctx, cache, module_cache, files)
+
+def _find_inputs(args, input_globs, library_globs):
+    # Sets the input and library files from their globs and file lists.
+    input_globs = list(input_globs)
+    for fname in args.file_list:
+        input_globs.extend(_read_file_list(fname))
+    args.input = _expand_globs(input_globs)
+    args.library = _expand_globs(library_globs)
+
+def _build(args, stdout, cache, module_cache, files, previous=None):
+    # `previous` is the context of an earlier build of the same library
+    # files, as in --watch.
+    units = parse_files(args.input, cache=cache, jobs=args.jobs, split=args.split)
     if args.print_ast:
         print_value(units, file=stdout)
 
-    root_scope = sema(units)
-    ctx = Context(units, root_scope)
+    if previous is not None and update(previous.root_scope, units):
+        root_scope = previous.root_scope
+        index = root_scope.index
+    else:
+        index = None
+        if args.library:
+            index = DeclIndex(cache=cache)
+            for fname in args.library:
+                index.add_file(fname)
+        root_scope = sema(units, index=index)
+
+    on_module = None
+    if args.stream:
+        if files is not None:
+            on_module = files.write
+        else:
+            on_module = lambda mod_inst: gen_verilog([mod_inst], file=stdout)
+    ctx = Context(units, root_scope, on_module=on_module, cache=module_cache, module_template=module_template, previous=previous)
 
     if args.module:
-        mod_inst_spec = parse_type(args.module)
-        ctx.instantiate_module(root_scope, mod_inst_spec.name, mod_inst_spec.args)
+        for module in args.module:
+            mod_inst_spec = parse_type(module)
+            ctx.instantiate_module(root_scope, mod_inst_spec.name, mod_inst_spec.args)
     else:
-        for name, entity in root_scope.items():
+        for name, entity in list(root_scope.items()):
             if entity.kind == 'module' and not entity.params:
                 ctx.instantiate_module(root_scope, name, ())
-    gen_verilog(ctx.all_modules(), file=stdout)
+    if not args.stream:
+        if files is not None:
+            gen_verilog_files(ctx.all_modules(), files, jobs=args.jobs)
+        else:
+            gen_verilog(ctx.all_modules(), file=stdout, jobs=args.jobs)
+    if files is not None:
+        files.close()
+
+    if args.depfile:
+        # Every input can change the output, e.g. by adding a top or
+        # shadowing a name, so only library files are pruned to those
+        # whose declarations the elaboration used.
+        deps = set(args.input)
+        deps.update(args.file_list)
+        if index is not None:
+            for fname, unit in index.units.items():
+                if any(decl in ctx.touched for decl in unit.decls):
+                    deps.add(fname)
+        _write_depfile(args.depfile, args.dep_target, sorted(deps))
+
+    return ctx
+
+def _write_stats(ctx, cache, module_cache, files):
+    if module_cache is cache:
+        if cache is not None:
+            sys.stderr.write(cache.format_stats('cache') + '\n')
+    else:
+        sys.stderr.write(cache.format_stats('ast cache') + '\n')
+        sys.stderr.write(module_cache.format_stats('module cache') + '\n')
+    if module_cache is not None:
+        sys.stderr.write('modules: {} reused, {} from the cache, {} stale\n'.format(ctx.reused_modules, ctx.cached_modules, ctx.stale_modules))
+    sys.stderr.write('elaboration: {} nodes shared\n'.format(ctx.shared_nodes))
+    if files is not None:
+        sys.stderr.write(files.format_stats('out dir') + '\n')
+
+def _mtimes(fnames):
+    r = []
+    for fname in fnames:
+        try:
+            r.append(os.path.getmtime(fname))
+        except OSError:
+            r.append(None)
+    return r
+
+def _watch(args, stdout, cache, input_globs, library_globs):
+    # Rebuilds the design whenever one of its files changes. The globs
+    # and file lists are expanded again before each check, so that added
+    # and removed files are noticed. Parsed files and generated modules
+    # are kept in memory between the builds, and as long as the library
+    # files stay the same, each build takes the module instances that do
+    # not depend on changed declarations from the previous one; only the
+    # others are elaborated again.
+    if cache is None:
+        cache = MemoryCache()
+    module_cache = MemoryCache()
+    known = {}
+    state = None
+    ctx = None
+    libraries = None
+    while True:
+        try:
+            _find_inputs(args, input_globs, library_globs)
+        except (RuntimeError, IOError) as e:
+            current = str(e), _mtimes(args.file_list)
+            if current != state:
+                state = current
+                sys.stderr.write('error: {}\n'.format(e))
+            time.sleep(args.watch_interval)
+            continue
+
+        watched = args.input + args.library + args.file_list
+        current = watched, _mtimes(watched)
+        if current != state:
+            state = current
+            if (args.library, _mtimes(args.library)) != libraries:
+                libraries = args.library, _mtimes(args.library)
+                ctx = None
+            start = time.time()
+            files = ModuleFiles(args.out_dir, known=known)
+            try:
+                ctx = _build(args, stdout, cache, module_cache, files, previous=ctx)
+            except ParseError as e:
+                # The declarations were left as they were.
+                sys.stderr.write('error: {}\n'.format(e))
+            except (RuntimeError, IOError) as e:
+                sys.stderr.write('error: {}\n'.format(e))
+                ctx = None
+            except Exception:
+                # Whatever else a half-edited file triggers must not end
+                # the watch either.
+                traceback.print_exc()
+                ctx = None
+            else:
+                sys.stderr.write('{} ({:.3f}s)\n'.format(files.format_stats('updated'), time.time() - start))
+                if args.cache_stats:
+                    _write_stats(ctx, cache, module_cache, None)
+            if isinstance(cache, MemoryCache):
+                cache.sweep()
+            module_cache.sweep()
+        time.sleep(args.watch_interval)
 
 if __name__ == '__main__':
     sys.exit(main())
@@ -1,4 +1,4 @@
-﻿import sys
+﻿import sys, re
 
 """
 Here's the list of all AST nodes produced by the parser, along with their attributes.
@@ -8,6 +8,7 @@ Here's the list of all AST nodes produced by the parser, along with their attrib
     * scope: scope (post-sema)
  * unit_decl = interface + enum + module
     * all unit decls have `name` and (after sema) `scope`.
+    * unit decls and defs have `_digest`, a hash of their tokens.
  * interface
     * name: str
     * params: [(str, type)]
@@ -32,6 +33,7 @@ Here's the list of all AST nodes produced by the parser, along with their attrib
     * scope: scope (post-sema)
     * defs: [def] (post-sema)
  * module-inst (post-sema)
+    * name: str -- the name of the emitted module
     * ports: [port]
     * decls: [signal + inst-inst + always + on]
     * specs
@@ -58,6 +60,7 @@ Here's the list of all AST nodes produced by the parser, along with their attrib
  * inst
     * name: str
     * module: str
+    * args: [arg]
     * port_maps: [port_map]
  * inst-inst (post-sema)
     * name: str
@@ -142,7 +145,9 @@ Here's the list of all AST nodes produced by the parser, along with their attrib
     * value: int
  * sized-num
     * size: int
-    * v: str
+    * value: int
+    * xmask: int -- bits that are x
+    * zmask: int -- bits that are z, or ? where the value bit is set
  * ref
     * name: str
  * enum-expr
@@ -154,19 +159,118 @@ Here's the list of all AST nodes produced by the parser, along with their attrib
 The value returned by the parser is a list of top declarations: 
 """
 
-class Node:
+# Attributes of each node kind, in the order in which they are printed.
+_node_attrs = {
+    'unit': ('decls', 'name', 'scope'),
+    'interface': ('name', 'params', 'decls', 'scope', 'symbols', '_digest'),
+    'intf-inst': ('specs', 'ports', 'ports_by_name', 'layouts'),
+    'use': ('type',),
+    'enum': ('name', 'enumers', 'scope', 'enumer_indexes', 'width', '_digest'),
+    'module': ('name', 'params', 'ports', 'scope', 'defs', 'symbols', '_digest'),
+    'module-inst': ('name', 'specs', 'scope', 'ports', 'ports_by_name', 'layouts', 'decls', 'template', 'submodules'),
+    'def': ('name', 'declare', 'decls', 'scope', 'mod', 'symbols', '_digest'),
+    'signal': ('name', 'type'),
+    'always': ('body',),
+    'on': ('specs', 'body'),
+    'test': ('body',),
+    'edgespec': ('rising', 'name'),
+    'inst': ('name', 'module', 'args', 'port_maps'),
+    'inst-inst': ('name', 'module', 'specs', 'type', 'port_maps'),
+    'port_map': ('target', 'source'),
+    'port': ('dir', 'name', 'type'),
+
+    'bit-type': (),
+    'auto-type': (),
+    'struct-type': ('name', 'args', 'decl'),
+    'arg': ('kw_name', 'value'),
+    'array-type': ('subtype', 'left_bound', 'right_bound'),
+    'set-type': ('enum', 'decl'),
+    'resolved-array-type': ('subtype', 'left_bound', 'right_bound'),
+    'intf-inst-type': ('decl',),
+    'module-inst-type': ('decl',),
+    'enum-type': ('decl',),
+    'int-type': (),
+    'atom-type': (),
+    'arith-type': (),
+    'set-lit-type': (),
+    'x-type': (),
+
+    'assign-stmt': ('lhs', 'rhs', 'delayed'),
+    'switch-stmt': ('value', 'cases'),
+    'case-stmt': ('value', 'body'),
+    'if-stmt': ('cond', 'true_body', 'false_body'),
+    'wait-stmt': ('expr',),
+    'assert-stmt': ('expr',),
+
+    'binary-expr': ('lhs', 'rhs', 'op', 'type', '_regrouped'),
+    'unary-expr': ('op', 'arg', 'type'),
+    'cast-expr': ('type', 'expr'),
+    'member-expr': ('expr', 'member', 'decl', 'type'),
+    'slice-expr': ('expr', 'lower_bound', 'upper_bound', 'type'),
+    'subscript-expr': ('expr', 'index', 'type'),
+    'call-expr': ('fn', 'args'),
+    'atom': ('name', 'type'),
+    'num': ('value', 'type'),
+    'sized-num': ('size', 'value', 'xmask', 'zmask', 'type'),
+    'ref': ('name', 'decl', 'type', 'slot'),
+    'enum-expr': ('value_index', 'type'),
+    'set-expr': ('items', 'type'),
+    'x-expr': ('type',),
+    }
+
+class Node(object):
+    """
+    `Node(kind, **attrs)` creates an instance of the class registered for
+    `kind`. Each kind has its own class with `__slots__` for the attributes
+    listed in `_node_attrs` and `kind` stored on the class, so nodes carry
+    no per-instance `__dict__`.
+    """
+    __slots__ = ()
+    kind = None
+
+    def __new__(cls, kind, **kw):
+        node_cls = _node_classes.get(kind)
+        if node_cls is None:
+            raise RuntimeError('unknown node kind: ' + kind)
+        return object.__new__(node_cls)
+
     def __init__(self, kind, **kw):
-        self.__dict__.update(kw)
-        self.kind = kind
+        for k, v in kw.items():
+            setattr(self, k, v)
+
+    def _items(self):
+        for k in self.__slots__:
+            v = getattr(self, k, _unset)
+            if v is not _unset:
+                yield k, v
 
     def attrs(self):
-        return ((k, v) for k, v in self.__dict__.items() if k != 'kind' and not k.startswith('_'))
+        return ((k, v) for k, v in self._items() if not k.startswith('_'))
+
+    def __reduce__(self):
+        return _make_node, (self.kind,), dict(self._items())
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
 
     def __repr__(self):
         r = [repr(self.kind)]
         r.extend(('{}={!r}'.format(k, v) for k, v in self.attrs()))
         return 'Node({})'.format(', '.join(r))
 
+_unset = object()
+
+def _make_node(kind):
+    return object.__new__(_node_classes[kind])
+
+def _class_name(kind):
+    return ''.join(part.capitalize() for part in re.split('[-_]', kind))
+
+_node_classes = {}
+for _kind, _attrs in _node_attrs.items():
+    _node_classes[_kind] = type(_class_name(_kind), (Node,), { '__slots__': _attrs, 'kind': _kind })
+
 def _print_value(v, nl=True, indent='', file=sys.stdout):
     if isinstance(v, list):
         if not v:
@@ -0,0 +1,147 @@
+import os, hashlib, pickle, tempfile, errno
+
+_replace = getattr(os, 'replace', os.rename)
+
+class DiskCache:
+    """
+    A directory of pickled values addressed by a hash of their key.
+
+    Entries live in `path/xx/xxxx...` like ccache's. A hit refreshes the
+    entry's mtime, and whenever the total size grows past `max_size` bytes
+    the least recently used entries are removed. Entries are written to a
+    temporary file and renamed into place, so concurrent processes sharing
+    a directory never observe partial entries.
+    """
+    def __init__(self, path, max_size=256<<20):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+
+    @staticmethod
+    def key(*parts):
+        h = hashlib.sha1()
+        for part in parts:
+            if not isinstance(part, bytes):
+                part = part.encode('utf-8')
+            h.update(('%d:' % len(part)).encode('ascii'))
+            h.update(part)
+        return h.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key[2:])
+
+    def get(self, key):
+        fname = self._entry_path(key)
+        try:
+            with open(fname, 'rb') as fin:
+                r = pickle.load(fin)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(fname, None)
+        except OSError:
+            # The cache may be shared read-only; the entry is still a hit.
+            pass
+        return r
+
+    def put(self, key, value):
+        fname = self._entry_path(key)
+        dir = os.path.dirname(fname)
+        try:
+            os.makedirs(dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        fd, tmp_name = tempfile.mkstemp(dir=dir, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                pickle.dump(value, fout, pickle.HIGHEST_PROTOCOL)
+                size = fout.tell()
+            _replace(tmp_name, fname)
+        except:
+            os.remove(tmp_name)
+            raise
+
+        if self._size is not None:
+            self._size += size
+        if self._size is None or self._size > self.max_size:
+            self._size = self._evict()
+
+    def _evict(self):
+        # Returns the size of the cache after the eviction.
+        entries = []
+        total = 0
+        for dir, dirnames, fnames in os.walk(self.path):
+            for fname in fnames:
+                if fname.startswith('.tmp'):
+                    continue
+                fname = os.path.join(dir, fname)
+                try:
+                    st = os.stat(fname)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, fname))
+                total += st.st_size
+
+        if total <= self.max_size:
+            return total
+
+        entries.sort()
+        for mtime, size, fname in entries:
+            try:
+                os.remove(fname)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_size:
+                break
+        return total
+
+    def format_stats(self, name):
+        return '{}: {} hits, {} misses'.format(name, self.hits, self.misses)
+
+class MemoryCache:
+    """
+    Keeps values in memory under the same keys as a `DiskCache`, for
+    a process that builds the same design repeatedly. Values are not
+    copied. Syntax trees are annotated in place by `sema`, which sets the
+    same attributes again on each build, so a tree may be shared by
+    builds that run one after another; other than that, values must not
+    be modified once stored.
+
+    `sweep` drops the entries that were neither read nor written since
+    the previous sweep.
+    """
+    key = staticmethod(DiskCache.key)
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._used = set()
+
+    def get(self, key):
+        r = self._entries.get(key)
+        if r is None:
+            self.misses += 1
+            return None
+        self._used.add(key)
+        self.hits += 1
+        return r
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._used.add(key)
+
+    def sweep(self):
+        for key in set(self._entries) - self._used:
+            del self._entries[key]
+        self._used = set()
+
+    def format_stats(self, name):
+        return '{}: {} hits, {} misses'.format(name, self.hits, self.misses)
@@ -0,0 +1,60 @@
+import json, os, socket, sys
+
+def _connect(path):
+    if not path or not hasattr(socket, 'AF_UNIX'):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+def main(args=None):
+    """
+    Takes the same arguments as `bv` and has the compile server listening
+    on $BV_SERVER run them. Without a server, and for --watch, which never
+    finishes, the arguments are run in this process instead.
+    """
+    if args is None:
+        args = sys.argv[1:]
+
+    sock = None
+    if '--watch' not in args:
+        sock = _connect(os.environ.get('BV_SERVER'))
+    if sock is None:
+        from .__main__ import main as bv_main
+        return bv_main(args)
+
+    try:
+        request = { 'op': 'run', 'args': args, 'cwd': os.getcwd() }
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        line = sock.makefile('rb').readline()
+    finally:
+        sock.close()
+    if not line:
+        sys.stderr.write('error: the compile server closed the connection\n')
+        return 1
+
+    response = json.loads(line.decode('utf-8'))
+    if 'error' in response:
+        sys.stderr.write('error: {}\n'.format(response['error']))
+        return 1
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['status']
+
+def server_main(args=None):
+    """
+    Runs the compile server, which is built on asyncio as it is in
+    Python 3.7 and newer.
+    """
+    if sys.version_info < (3, 7):
+        sys.stderr.write('error: bv-server requires Python 3.7 or newer\n')
+        return 1
+    from .server import main as _server_main
+    return _server_main(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
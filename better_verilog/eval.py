@@ -1,7 +1,19 @@
-import math
+from .ast import Node
+
+def _log2(x):
+    if x <= 0:
+        raise ValueError('log2 of a non-positive number')
+    return int(x).bit_length() - 1
 
 _builtin_fns = {
-    'log2': lambda x: int(math.log(x, 2))
+    'log2': _log2
+    }
+
+_int_binary_ops = {
+    '+': lambda lhs, rhs: lhs + rhs,
+    '-': lambda lhs, rhs: lhs - rhs,
+    '*': lambda lhs, rhs: lhs * rhs,
+    '/': lambda lhs, rhs: lhs // rhs,
     }
 
 def eval_builtin_fn(scope, expr):
@@ -9,32 +21,78 @@ def eval_builtin_fn(scope, expr):
         return _builtin_fns[expr.name]
     raise RuntimeError('invalid fn')
 
+def fold_int_expr(expr):
+    """
+    Folds the constant subexpressions of the integer expression `expr`
+    into `num` nodes, in place, and returns the folded expression.
+
+    Subexpressions that depend on a parameter are kept, as are those whose
+    evaluation fails, so that the error is reported by the elaboration that
+    actually needs the value.
+    """
+    if expr.kind == 'unary-expr':
+        expr.arg = fold_int_expr(expr.arg)
+        if expr.op == '-' and expr.arg.kind == 'num':
+            return Node('num', value=-expr.arg.value)
+    elif expr.kind == 'binary-expr':
+        expr.lhs = fold_int_expr(expr.lhs)
+        expr.rhs = fold_int_expr(expr.rhs)
+        op = _int_binary_ops.get(expr.op)
+        if op is not None and expr.lhs.kind == 'num' and expr.rhs.kind == 'num':
+            try:
+                return Node('num', value=op(expr.lhs.value, expr.rhs.value))
+            except ZeroDivisionError:
+                pass
+    elif expr.kind == 'call-expr':
+        expr.args = [fold_int_expr(arg) for arg in expr.args]
+        fn = _builtin_fns.get(expr.fn.name) if expr.fn.kind == 'ref' else None
+        if fn is not None and all(arg.kind == 'num' for arg in expr.args):
+            try:
+                return Node('num', value=fn(*[arg.value for arg in expr.args]))
+            except ValueError:
+                pass
+    return expr
+
 def eval_int_expr(scope, expr):
+    """
+    Evaluates the integer expression `expr` in `scope`.
+
+    If `scope` is a frame of a declaration instance, the result is
+    memoized by the expression and the instance's parameters, which are
+    the only values an integer expression can depend on.
+    """
+    if expr.kind == 'num':
+        return expr.value
+    memo = getattr(scope, 'int_memo', None)
+    if memo is None:
+        return _eval_int_expr(scope, expr)
+    key = expr, scope.args
+    r = memo.get(key)
+    if r is None:
+        r = _eval_int_expr(scope, expr)
+        memo[key] = r
+    return r
+
+def _eval_int_expr(scope, expr):
     if expr.kind == 'num':
         return expr.value
     if expr.kind == 'sized-num':
-        if any(c in 'xz?' for c in expr.v):
+        if expr.xmask or expr.zmask:
             raise RuntimeError('invalid int expr')
-        return int(expr.v, 2)
+        return expr.value
     if expr.kind == 'unary-expr':
         if expr.op == '-':
-            return -eval_int_expr(scope, expr.arg)
+            return -_eval_int_expr(scope, expr.arg)
     if expr.kind == 'binary-expr':
-        lhs = eval_int_expr(scope, expr.lhs)
-        rhs = eval_int_expr(scope, expr.rhs)
-        if expr.op == '+':
-            return lhs + rhs
-        if expr.op == '-':
-            return lhs - rhs
-        if expr.op == '*':
-            return lhs * rhs
-        if expr.op == '/':
-            return lhs / rhs
+        op = _int_binary_ops.get(expr.op)
+        if op is not None:
+            return op(_eval_int_expr(scope, expr.lhs), _eval_int_expr(scope, expr.rhs))
     if expr.kind == 'call-expr':
         callee = eval_builtin_fn(scope, expr.fn)
-        args = [eval_int_expr(scope, arg) for arg in expr.args]
+        args = [_eval_int_expr(scope, arg) for arg in expr.args]
         return callee(*args)
     if expr.kind == 'ref':
-        target = scope.lookup(expr.name)
-        return eval_int_expr(getattr(target, 'scope', None), target)
+        slot = getattr(expr, 'slot', None)
+        target = scope.get(slot) if slot is not None else scope.lookup(expr.name)
+        return _eval_int_expr(getattr(target, 'scope', None), target)
     raise RuntimeError('invalid int expr')
@@ -1,6 +1,43 @@
-﻿import math
+﻿import os, multiprocessing, hashlib, tempfile, errno
 from .ast import Node
 from .eval import eval_int_expr
+from .parser import binary_op_prec, assoc_binary_ops, _negated_ops
+from .cache import _replace
+
+# Sized numbers at least this wide are written in hex when each of their
+# x, z and ? bits belongs to a digit made only of such bits.
+_hex_min_size = 64
+
+def _nibble_uniform(mask, ndigits):
+    # True if every hex digit of `mask` is either 0 or f.
+    ones = ((1 << 4*ndigits) - 1) // 0xf
+    return (mask & ones) * 0xf == mask
+
+def _set_digits(digits, mask, bits, char):
+    # Sets the digits covered by `mask` to `char`. `digits` is a list in
+    # msb-first order, each digit covering `bits` bits.
+    while mask:
+        pos = (mask & -mask).bit_length() - 1
+        pos -= pos % bits
+        digits[len(digits) - 1 - pos // bits] = char
+        mask &= ~(((1 << bits) - 1) << pos)
+
+def format_sized_num(size, value, xmask, zmask):
+    qmask = value & zmask
+    zmask &= ~qmask
+    ndigits = (size + 3) // 4
+    if size >= _hex_min_size and all(_nibble_uniform(mask, ndigits) for mask in (xmask, zmask, qmask)):
+        base, bits, fmt = 'h', 4, '0{}x'.format(ndigits)
+    else:
+        base, bits, fmt = 'b', 1, '0{}b'.format(size)
+    digits = format(value & ~(xmask | zmask | qmask), fmt)
+    if xmask or zmask or qmask:
+        digits = list(digits)
+        _set_digits(digits, xmask, bits, 'x')
+        _set_digits(digits, zmask, bits, 'z')
+        _set_digits(digits, qmask, bits, '?')
+        digits = ''.join(digits)
+    return '{}\'{}{}'.format(size, base, digits)
 
 def expand_port(name, dir, type, out_dir='o'):
     # -> (output: bool, name: str, bounds: str)
@@ -14,12 +51,10 @@ def expand_port(name, dir, type, out_dir='o'):
     if type.kind == 'bit-type':
         return [(dir == out_dir, name, bounds)]
     elif type.kind == 'intf-inst-type':
-        r = []
-        for e_out, e_name, e_bounds in expand_ports(type.decl.ports, dir):
-            r.append((e_out, '{}__{}'.format(name, e_name), bounds + e_bounds))
-        return r
+        prefix = name + '__'
+        return [(e_out, prefix + e_name, bounds + e_bounds) for e_out, e_name, e_bounds in port_layout(type.decl, dir)]
     elif type.kind == 'enum-type':
-        return [(dir == out_dir, name, '[{}:0]'.format(int(math.ceil(math.log(len(type.decl.enumers), 2)))-1))]
+        return [(dir == out_dir, name, '[{}:0]'.format(type.decl.width - 1))]
     elif type.kind == 'set-type':
         return [(dir == out_dir, name, '[{}:0]'.format(len(type.decl.enumers)-1))]
     else:
@@ -32,6 +67,22 @@ def expand_ports(ports, out_dir='o'):
         r.extend(expand_port(port.name, port.dir, port.type, out_dir))
     return r
 
+def port_layout(inst, out_dir='o'):
+    """
+    Returns `expand_ports(inst.ports, out_dir)` for an interface or module
+    instance. The result is computed once per instance and direction and
+    kept in `inst.layouts`; callers must not modify it.
+    """
+    layouts = getattr(inst, 'layouts', None)
+    if layouts is None:
+        layouts = {}
+        inst.layouts = layouts
+    r = layouts.get(out_dir)
+    if r is None:
+        r = expand_ports(inst.ports, out_dir)
+        layouts[out_dir] = r
+    return r
+
 _binary_ops = {
     'and': '&',
     'or': '|',
@@ -52,6 +103,8 @@ def _resolve_expr(expr):
         return ('{}__{}'.format(name, expr.member), suffix)
     if expr.kind == 'unary-expr':
         arg = resolve_expr(expr.arg)
+        if expr.arg.kind == 'binary-expr':
+            arg = '({})'.format(arg)
         if expr.op == 'not':
             return '!{}'.format(arg), ''
         else:
@@ -59,101 +112,337 @@ def _resolve_expr(expr):
     if expr.kind == 'num':
         return (str(expr.value), '')
     if expr.kind == 'sized-num':
-        return ('{}\'b{}'.format(expr.size, expr.v), '')
+        return (format_sized_num(expr.size, expr.value, expr.xmask, expr.zmask), '')
     if expr.kind == 'enum-expr':
-        return ('{}\'d{}'.format(int(math.ceil(math.log(len(expr.type.decl.enumers), 2))), expr.value_index), '')
+        return ('{}\'d{}'.format(expr.type.decl.width, expr.value_index), '')
     if expr.kind == 'binary-expr':
-        return '{} {} {}'.format(resolve_expr(expr.lhs), _binary_ops.get(expr.op, expr.op), resolve_expr(expr.rhs)), ''
+        if getattr(expr, '_regrouped', False):
+            return _resolve_regrouped_expr(expr), ''
+        lhs = resolve_expr(expr.lhs)
+        rhs = resolve_expr(expr.rhs)
+        prec = binary_op_prec[expr.op]
+        if expr.lhs.kind == 'binary-expr' and binary_op_prec[expr.lhs.op] < prec:
+            lhs = '({})'.format(lhs)
+        if expr.rhs.kind == 'binary-expr':
+            rhs_prec = binary_op_prec[expr.rhs.op]
+            if rhs_prec < prec or (rhs_prec == prec and (expr.rhs.op != expr.op or expr.op not in assoc_binary_ops)):
+                rhs = '({})'.format(rhs)
+        return '{} {} {}'.format(lhs, _binary_ops.get(expr.op, expr.op), rhs), ''
     raise RuntimeError('unknown expr')
 
+def _regrouped_terms(expr, negated, op, terms):
+    # Appends the `(op, operand)` pairs of a run of `+` and `-` that the
+    # parser regrouped to `terms`, in source order. The operators below
+    # the right-hand side of a `-` were negated by the regrouping.
+    if not getattr(expr, '_regrouped', False):
+        terms.append((op, expr))
+        return
+    _regrouped_terms(expr.lhs, negated, op, terms)
+    rhs_op = _negated_ops[expr.op] if negated else expr.op
+    _regrouped_terms(expr.rhs, negated != (expr.op == '-'), rhs_op, terms)
+
+def _resolve_regrouped_expr(expr):
+    terms = []
+    _regrouped_terms(expr, False, None, terms)
+    prec = binary_op_prec['+']
+    r = []
+    for op, arg in terms:
+        text = resolve_expr(arg)
+        if arg.kind == 'binary-expr' and (binary_op_prec[arg.op] < prec or (op is not None and binary_op_prec[arg.op] == prec)):
+            text = '({})'.format(text)
+        if op is not None:
+            r.append(op)
+        r.append(text)
+    return ' '.join(r)
+
 def resolve_expr(expr):
     name, suffix = _resolve_expr(expr)
     return name + suffix
 
-def format_assign_stmt(lhs, rhs, fmt):
+def iter_assign_stmt(lhs, rhs, fmt):
     if rhs.type.kind == 'x-type':
         assert rhs.kind == 'x-expr'
         if lhs.type.kind == 'intf-inst-type':
             lhs_name, lhs_suf = _resolve_expr(lhs)
-            r = []
-            for output, name, bounds in expand_ports(lhs.type.decl.ports):
-                r.append(fmt.format('{}__{}{}{}'.format(lhs_name, name, lhs_suf, bounds), '1\'sbx'))
-            return r
+            for output, name, bounds in port_layout(lhs.type.decl):
+                yield fmt.format('{}__{}{}{}'.format(lhs_name, name, lhs_suf, bounds), '1\'sbx')
         elif lhs.type.kind == 'resolved-array-type':
-            return [fmt.format(resolve_expr(lhs), '1\'sbx')]
+            yield fmt.format(resolve_expr(lhs), '1\'sbx')
         else:
             raise RuntimeError('invalid type')
     else:
         lhs = resolve_expr(lhs)
         rhs = resolve_expr(rhs)
-        return [fmt.format(lhs, rhs)]
+        yield fmt.format(lhs, rhs)
 
-def format_stmt(stmt, indent):
+def iter_stmt(stmt, indent):
+    """
+    Yields the Verilog text of `stmt` in chunks, so that nested bodies
+    are written out as they are generated rather than being concatenated
+    into the text of every enclosing statement.
+    """
     if stmt.kind == 'assign-stmt':
-        return ''.join(format_assign_stmt(stmt.lhs, stmt.rhs, '{}{} {} {};\n'.format(indent, '{}', '<=' if stmt.delayed else '=', '{}')))
-    if stmt.kind == 'if-stmt':
-        cond = resolve_expr(stmt.cond)
-        true_body = format_stmts(stmt.true_body, indent + '    ')
+        for chunk in iter_assign_stmt(stmt.lhs, stmt.rhs, '{}{} {} {};\n'.format(indent, '{}', '<=' if stmt.delayed else '=', '{}')):
+            yield chunk
+    elif stmt.kind == 'if-stmt':
+        yield '{}if ({}) begin\n'.format(indent, resolve_expr(stmt.cond))
+        for chunk in iter_stmts(stmt.true_body, indent + '    '):
+            yield chunk
         if stmt.false_body is not None:
-            false_body = format_stmts(stmt.false_body, indent + '    ')
-            return '{ind}if ({cond}) begin\n{tr}{ind}end else begin\n{fal}{ind}end\n'.format(ind=indent, cond=cond, tr=true_body, fal=false_body)
-        else:
-            return '{ind}if ({cond}) begin\n{tr}{ind}end\n'.format(ind=indent, cond=cond, tr=true_body)
-    if stmt.kind == 'switch-stmt':
-        body = []
+            yield '{}end else begin\n'.format(indent)
+            for chunk in iter_stmts(stmt.false_body, indent + '    '):
+                yield chunk
+        yield '{}end\n'.format(indent)
+    elif stmt.kind == 'switch-stmt':
+        yield '{}casez ({})\n'.format(indent, resolve_expr(stmt.value))
         for case in stmt.cases:
-            case_value = resolve_expr(case.value)
-            stmts = format_stmts(case.body, indent + '        ')
-            body.append('{ind}{val}: begin\n{stmts}{ind}end\n'.format(ind=indent + '    ', val=case_value, stmts=stmts))
-        return '{ind}casez ({val})\n{body}{ind}endcase\n'.format(ind=indent, val=resolve_expr(stmt.value), body=''.join(body))
-    raise RuntimeError('unknown stmt')
+            yield '{}    {}: begin\n'.format(indent, resolve_expr(case.value))
+            for chunk in iter_stmts(case.body, indent + '        '):
+                yield chunk
+            yield '{}    end\n'.format(indent)
+        yield '{}endcase\n'.format(indent)
+    else:
+        raise RuntimeError('unknown stmt')
 
-def format_stmts(stmts, indent):
-    return ''.join([format_stmt(stmt, indent) for stmt in stmts])
+def iter_stmts(stmts, indent):
+    for stmt in stmts:
+        for chunk in iter_stmt(stmt, indent):
+            yield chunk
 
-def _gen_module(mod, fin):
-    ports = []
+def _iter_decl(decl, module_name):
+    if decl.kind == 'always':
+        yield 'always @(*) begin\n'
+        for chunk in iter_stmts(decl.body, '    '):
+            yield chunk
+        yield 'end\n'
+    elif decl.kind == 'on':
+        specs = []
+        for spec in decl.specs:
+            dir = 'posedge' if spec.rising else 'negedge'
+            specs.append('{} {}'.format(dir, spec.name))
+        yield 'always @({}) begin\n'.format(' or '.join(specs))
+        for chunk in iter_stmts(decl.body, '    '):
+            yield chunk
+        yield 'end\n'
+    elif decl.kind == 'inst-inst':
+        pms = []
+        for output, name, bounds in port_layout(decl.module):
+            if output:
+                yield 'wire{} {}__{};\n'.format(bounds, decl.name, name)
+                pms.append('.{}({}__{})'.format(name, decl.name, name))
+
+        for pm in decl.port_maps:
+            pms.append('.{}({})'.format(resolve_expr(pm.target), resolve_expr(pm.source)))
+        yield '{} {}(\n    {}\n    );\n'.format(module_name(decl.module), decl.name, ',\n    '.join(pms))
+    elif decl.kind == 'signal':
+        for output, name, bounds in expand_port(decl.name, None, decl.type):
+            yield 'reg{} {};\n'.format(bounds, name)
+    else:
+        raise RuntimeError('unknown decl')
 
-    for output, name, bounds in expand_ports(mod.ports):
+def _module_name(mod):
+    return mod.name
+
+def iter_module(mod, module_name=_module_name):
+    """
+    Yields the Verilog text of the module instance `mod` in chunks.
+    `module_name` returns the name under which a module instance, `mod`
+    itself or one of its submodules, is written.
+    """
+    if getattr(mod, 'template', None) is not None:
+        yield fill_template(mod.template, [module_name(mod)] + [module_name(inst) for inst in mod.submodules])
+        return
+
+    ports = []
+    for output, name, bounds in port_layout(mod):
         ports.append('{}{} {}'.format('output reg' if output else 'input', bounds, name))
+    yield 'module {}(\n    {}\n    );\n\n'.format(module_name(mod), ',\n    '.join(ports))
 
-    decls = []
+    # Each signal, i.e. each line of a multi-port signal, counts as
+    # a separate decl and decls are separated by empty lines.
+    first = True
     for decl in mod.decls:
-        if decl.kind == 'always':
-            decls.append('always @(*) begin\n{}end\n'.format(format_stmts(decl.body, '    ')))
-        elif decl.kind == 'on':
-            specs = []
-            for spec in decl.specs:
-                dir = 'posedge' if spec.rising else 'negedge'
-                specs.append('{} {}'.format(dir, spec.name))
-            decls.append('always @({}) begin\n{}end\n'.format(' or '.join(specs), format_stmts(decl.body, '    ')))
-        elif decl.kind == 'inst-inst':
-            out = []
-            pms = []
-            for output, name, bounds in expand_ports(decl.module.ports):
-                if output:
-                    out.append('wire{} {}__{};\n'.format(bounds, decl.name, name))
-                    pms.append('.{}({}__{})'.format(name, decl.name, name))
-
-            for pm in decl.port_maps:
-                pms.append('.{}({})'.format(resolve_expr(pm.target), resolve_expr(pm.source)))
-            out.append('{} {}(\n    {}\n    );\n'.format(decl.module.specs[0].name, decl.name, ',\n    '.join(pms)))
-            decls.append(''.join(out))
-        elif decl.kind == 'signal':
-            for output, name, bounds in expand_port(decl.name, None, decl.type):
-                decls.append('reg{} {};\n'.format(bounds, name))
+        if decl.kind == 'signal':
+            for chunk in _iter_decl(decl, module_name):
+                if not first:
+                    yield '\n'
+                first = False
+                yield chunk
         else:
-            raise RuntimeError('unknown decl')
-    fin.write('''\
-module {name}(
-    {ports}
-    );
+            if not first:
+                yield '\n'
+            first = False
+            for chunk in _iter_decl(decl, module_name):
+                yield chunk
+    yield '\nendmodule\n\n'
 
-{decls}
-endmodule
+def module_template(mod):
+    """
+    Returns `(template, submodules)`, where `template` is the text of
+    `mod` with its name and the names of its `submodules` replaced by
+    placeholders, for `fill_template` to put back.
+    """
+    submodules = []
+    indexes = {}
+    def module_name(inst):
+        if inst is mod:
+            return '\0' '0' '\0'
+        i = indexes.get(inst)
+        if i is None:
+            submodules.append(inst)
+            i = len(submodules)
+            indexes[inst] = i
+        return '\0{}\0'.format(i)
+    return ''.join(iter_module(mod, module_name)), submodules
 
-'''.format(name=mod.specs[0].name, ports=',\n    '.join(ports), decls='\n'.join(decls)))
+def fill_template(template, names):
+    # `names[0]` is the module's own name, `names[i]` that of submodule i.
+    parts = template.split('\0')
+    parts[1::2] = [names[int(i)] for i in parts[1::2]]
+    return ''.join(parts)
 
-def gen_verilog(mods, file):
+def iter_verilog(mods):
     for mod in mods:
-        _gen_module(mod, file)
+        for chunk in iter_module(mod):
+            yield chunk
+
+_worker_mods = None
+
+def _gen_module_worker(index):
+    return ''.join(iter_module(_worker_mods[index]))
+
+def _fork_pool(processes):
+    get_context = getattr(multiprocessing, 'get_context', None)
+    if get_context is None:
+        return multiprocessing.Pool(processes)
+    return get_context('fork').Pool(processes)
+
+def _module_texts(mods, jobs):
+    # Yields the text of each of `mods` in order, formatted by forked
+    # workers unless `jobs` is 1 or fork is not available.
+    if jobs == 1 or len(mods) < 2 or not hasattr(os, 'fork'):
+        for mod in mods:
+            yield ''.join(iter_module(mod))
+        return
+
+    global _worker_mods
+    _worker_mods = mods
+    try:
+        processes = jobs or multiprocessing.cpu_count()
+        pool = _fork_pool(processes)
+        try:
+            chunksize = max(1, len(mods) // (8 * processes))
+            for text in pool.imap(_gen_module_worker, range(len(mods)), chunksize):
+                yield text
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        _worker_mods = None
+
+def gen_verilog(mods, file, jobs=1):
+    """
+    Writes the Verilog text of the module instances `mods` to `file`.
+
+    With `jobs` other than 1, the modules are formatted by a pool of that
+    many worker processes (or one per CPU if `jobs` is 0 or None) and
+    written in order as they arrive. The workers are forked, so that they
+    inherit the elaborated modules, which refer to the whole AST, instead
+    of receiving a pickled copy; where `fork` is not available, the
+    modules are formatted serially.
+    """
+    write = file.write
+    mods = list(mods)
+    if jobs == 1:
+        for chunk in iter_verilog(mods):
+            write(chunk)
+    else:
+        for text in _module_texts(mods, jobs):
+            write(text)
+
+class ModuleFiles:
+    """
+    Writes each module to `out_dir/<name>.v`.
+
+    A file whose content would not change is left alone, keeping its
+    mtime, so that make and the incremental modes of downstream tools
+    skip it. `close` writes `out_dir/files.f`, which lists the files
+    of all modules written since the object was created.
+
+    `known` maps file names to the (size, mtime, SHA-1) of their content
+    as last read or written. A process that writes the same directory
+    repeatedly can pass the same dict to each new object, so that files
+    whose size and mtime did not change are not read again.
+    """
+    def __init__(self, out_dir, known=None):
+        self.out_dir = out_dir
+        self.known = known if known is not None else {}
+        self.fnames = []
+        self.written = 0
+        self.unchanged = 0
+
+        # mkstemp creates files only their owner can read.
+        self._mode = os.umask(0)
+        os.umask(self._mode)
+        self._mode = 0o666 & ~self._mode
+
+        try:
+            os.makedirs(out_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def write(self, mod, text=None):
+        if text is None:
+            text = ''.join(iter_module(mod))
+        fname = os.path.join(self.out_dir, mod.name + '.v')
+        self.fnames.append(fname)
+        if self._update(fname, text):
+            self.written += 1
+        else:
+            self.unchanged += 1
+
+    def close(self):
+        self._update(os.path.join(self.out_dir, 'files.f'), ''.join(fname + '\n' for fname in self.fnames))
+
+    def _update(self, fname, text):
+        # Returns False if `fname` already has the content `text`.
+        data = text.encode('utf-8')
+        digest = hashlib.sha1(data).digest()
+        try:
+            st = os.stat(fname)
+            if st.st_size == len(data):
+                known = self.known.get(fname)
+                if known is None or known[:2] != (st.st_size, st.st_mtime):
+                    with open(fname, 'rb') as fin:
+                        known = st.st_size, st.st_mtime, hashlib.sha1(fin.read()).digest()
+                    self.known[fname] = known
+                if known[2] == digest:
+                    return False
+        except (IOError, OSError):
+            pass
+
+        fd, tmp_name = tempfile.mkstemp(dir=self.out_dir, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                fout.write(data)
+            os.chmod(tmp_name, self._mode)
+            _replace(tmp_name, fname)
+        except:
+            os.remove(tmp_name)
+            raise
+        st = os.stat(fname)
+        self.known[fname] = st.st_size, st.st_mtime, digest
+        return True
+
+    def format_stats(self, name):
+        return '{}: {} written, {} unchanged'.format(name, self.written, self.unchanged)
+
+def gen_verilog_files(mods, files, jobs=1):
+    """
+    Writes the module instances `mods` with the `ModuleFiles` object
+    `files`, formatting them in parallel as `gen_verilog` does.
+    """
+    mods = list(mods)
+    for mod, text in zip(mods, _module_texts(mods, jobs)):
+        files.write(mod, text)
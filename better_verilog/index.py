@@ -0,0 +1,77 @@
+import re
+from .ast import Node
+from .lexer import ParseError
+from .parser import parse_text, chunk_end, _file_name
+
+_decl_re = re.compile(r'^(module|def|interface|struct|enum)[ \t]+(?:module[ \t]+)?([a-zA-Z_][a-zA-Z_0-9]*)', re.M)
+
+class DeclIndex:
+    """
+    Maps names of top-level declarations in library files to their location,
+    so that they can be parsed only once something refers to them.
+
+    `add_file` finds the declarations with a regex over the lines that start
+    in the first column, without running the grammar. `load` parses all
+    declarations of a name and appends them to `units[fname]`, a `unit` node
+    per library file holding what was loaded from it so far.
+    """
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.units = {}
+        self._entries = {}
+        self._texts = {}
+
+    def add_file(self, fname):
+        with open(fname, 'r') as fin:
+            text = fin.read().replace('\r', '')
+        line = 1
+        pos = 0
+        for m in _decl_re.finditer(text):
+            line += text.count('\n', pos, m.start())
+            pos = m.start()
+            self._entries.setdefault(m.group(2), []).append((fname, m.start(), line, m.group(1)))
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def load(self, name, kinds=None):
+        """
+        Parses and returns the not yet loaded declarations called `name`,
+        optionally only those whose keyword is in `kinds`.
+        """
+        entries = self._entries.get(name, ())
+        rest = []
+        r = []
+        for entry in entries:
+            fname, offset, line, kind = entry
+            if kinds is not None and kind not in kinds:
+                rest.append(entry)
+                continue
+
+            text = self._text(fname)
+            try:
+                decls = parse_text(text[offset:chunk_end(text, offset)], line, cache=self.cache).decls
+            except ParseError as e:
+                e.fname = fname
+                raise
+
+            unit = self.units.get(fname)
+            if unit is None:
+                unit = Node('unit', decls=[], name=_file_name(fname))
+                self.units[fname] = unit
+            unit.decls.extend(decls)
+            r.extend(decls)
+
+        if rest:
+            self._entries[name] = rest
+        else:
+            self._entries.pop(name, None)
+        return r
+
+    def _text(self, fname):
+        text = self._texts.get(fname)
+        if text is None:
+            with open(fname, 'r') as fin:
+                text = fin.read().replace('\r', '')
+            self._texts[fname] = text
+        return text
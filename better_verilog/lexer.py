@@ -0,0 +1,110 @@
+import re
+from collections import namedtuple
+
+"""
+Turns a better_verilog source into a flat list of tokens.
+
+Blank and comment-only lines produce no tokens. Block structure is encoded
+the same way Python's tokenizer does it, except that `dedent` tokens come
+before the `newline` that separates the block from the next statement:
+
+    a:          ident(a) op(:)
+        b       newline indent ident(b)
+        c       newline ident(c)
+    d           dedent newline ident(d)
+                newline eof
+
+so a block is always `newline indent stmt (newline stmt)* dedent`.
+"""
+
+Token = namedtuple('Token', 'kind value line col')
+
+class ParseError(Exception):
+    """
+    `fname` is the name of the file being parsed, which is filled in by
+    the callers that know it.
+    """
+    def __init__(self, msg, line, col, fname=None):
+        self.msg = msg
+        self.line = line
+        self.col = col
+        self.fname = fname
+        super(ParseError, self).__init__(msg, line, col)
+
+    def __reduce__(self):
+        return ParseError, (self.msg, self.line, self.col, self.fname)
+
+    def __str__(self):
+        if self.fname is not None:
+            return '{}:{}:{}: {}'.format(self.fname, self.line, self.col, self.msg)
+        return '{}:{}: {}'.format(self.line, self.col, self.msg)
+
+_blank_re = re.compile(r'[ \t]*(?:#[^\n]*)?(?:\n|\Z)')
+_indent_re = re.compile(r'[ \t]*')
+_token_re = re.compile(r'''[ \t]*(?:
+    (?P<ident>[a-zA-Z_][a-zA-Z_0-9]*)
+    |(?P<num>[0-9]+(?:
+        '(?:b[01xz?_]+|o[0-7xz?_]+|d[0-9_]+|h[0-9a-fxz?_]+)
+        |\.[0-9]+(?:e[+-]?[0-9]+)?
+        |(?:\.[0-9]+)?e[+-]?[0-9]+
+        )?)
+    |(?P<op><=|==|[=()\[\]{},:.'+\-*/])
+    |(?P<end>(?:\#[^\n]*)?(?:\n|\Z))
+    )''', re.X)
+
+def tokenize(text, line=1):
+    """
+    Returns the list of tokens of `text`, which must not contain '\\r'.
+    `line` is the number of the first line of `text`, so that a fragment
+    of a larger source reports the right locations.
+    """
+    tokens = []
+    indents = ['']
+    eol = line, 1
+    pos = 0
+    end = len(text)
+    while pos < end:
+        m = _blank_re.match(text, pos)
+        if m is not None:
+            pos = m.end()
+            line += 1
+            continue
+
+        line_start = pos
+        cur = _indent_re.match(text, pos).group()
+        if not tokens:
+            if cur:
+                raise ParseError('unexpected indent', line, 1)
+        elif cur == indents[-1]:
+            tokens.append(Token('newline', None, *eol))
+        elif cur.startswith(indents[-1]):
+            tokens.append(Token('newline', None, *eol))
+            tokens.append(Token('indent', cur, line, 1))
+            indents.append(cur)
+        else:
+            while cur != indents[-1]:
+                if not indents[-1].startswith(cur):
+                    raise ParseError('inconsistent indentation', line, 1)
+                indents.pop()
+                tokens.append(Token('dedent', None, line, 1))
+            tokens.append(Token('newline', None, *eol))
+
+        while True:
+            m = _token_re.match(text, pos)
+            if m is None:
+                bad = _indent_re.match(text, pos).end()
+                raise ParseError('unexpected character {!r}'.format(text[bad]), line, bad - line_start + 1)
+            kind = m.lastgroup
+            pos = m.end()
+            if kind == 'end':
+                eol = line, m.start(kind) - line_start + 1
+                break
+            tokens.append(Token(kind, m.group(kind), line, m.start(kind) - line_start + 1))
+        line += 1
+
+    for _ in indents[1:]:
+        tokens.append(Token('dedent', None, line, 1))
+    if tokens:
+        tokens.append(Token('newline', None, *eol))
+    tokens.append(Token('eof', None, line, 1))
+    return tokens
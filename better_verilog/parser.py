@@ -1,71 +1,242 @@
-﻿import speg, os.path
+﻿import os.path, re, multiprocessing, hashlib
 from .ast import Node, print_value
+from .lexer import tokenize, ParseError
+from .cache import DiskCache
+
+class _Backtrack(Exception):
+    pass
+
+class _Parser:
+    """
+    A PEG driver over the token list produced by `tokenize`.
+
+    Rules are called as `p(rule, *args)` and `p('(')` consumes an operator
+    token. A failed match raises `_Backtrack`, which unwinds to the innermost
+    `with p:` block and restores the position at which the block was entered,
+    or at which `p.commit()` was last called inside it. After the block,
+    `bool(p)` tells whether it succeeded.
+
+    A rule that is not memoized may also be called as `rule(p)`, which
+    saves the driver's stack frame; the rules through which parentheses
+    nest are called that way.
+    """
+    def __init__(self, tokens, memo=None):
+        self.memo = memo
+        self._tokens = tokens
+        self._pos = [0]
+        self._committed = [False]
+        self._err_pos = -1
+        self._expected = set()
+
+    def __call__(self, r, *args):
+        if isinstance(r, str):
+            return self.match('op', r)
+        memo = self.memo
+        if memo is None or r not in _memoized_rules:
+            return r(self, *args)
+
+        # The memo is consulted here rather than in a wrapper around the
+        # rule, so that a memoized rule costs no extra stack frame.
+        key = r, args, self._pos[-1]
+        m = memo.get(key)
+        if m is _failed:
+            raise _Backtrack()
+        if m is not None:
+            value, self._pos[-1] = m
+            return value
+
+        try:
+            value = r(self, *args)
+        except _Backtrack:
+            memo.put(key, _failed)
+            raise
+        memo.put(key, (value, self._pos[-1]))
+        return value
+
+    def peek(self):
+        return self._tokens[self._pos[-1]]
+
+    def pos(self):
+        return self._pos[-1]
+
+    def digest(self, start):
+        """
+        Returns a hash of the tokens from `start` to the current position.
+        Indentation is hashed by structure only, and comments and blank
+        lines are not tokens, so they do not affect the result.
+        """
+        h = hashlib.sha1()
+        for tok in self._tokens[start:self._pos[-1]]:
+            value = tok.value if tok.kind != 'indent' else None
+            h.update(repr((tok.kind, value)).encode('utf-8'))
+        return h.hexdigest()
+
+    def match(self, kind, value=None):
+        tok = self._tokens[self._pos[-1]]
+        if tok.kind != kind or (value is not None and tok.value != value):
+            self.error(value if value is not None else kind)
+        self._pos[-1] += 1
+        return tok.value
+
+    def error(self, expected):
+        pos = self._pos[-1]
+        if pos > self._err_pos:
+            self._err_pos = pos
+            self._expected = set()
+        if pos == self._err_pos:
+            self._expected.add(expected)
+        raise _Backtrack()
+
+    def parse_error(self):
+        tok = self._tokens[self._err_pos]
+        found = tok.value if tok.value is not None else tok.kind
+        msg = 'expected {}, found {!r}'.format(' or '.join(sorted(repr(e) for e in self._expected)), found)
+        return ParseError(msg, tok.line, tok.col)
+
+    def opt(self, *args):
+        with self:
+            return self(*args)
+
+    def commit(self):
+        self._pos[-2] = self._pos[-1]
+        self._committed[-2] = True
+
+    def __enter__(self):
+        self._committed[-1] = False
+        self._pos.append(self._pos[-1])
+        self._committed.append(False)
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.commit()
+        self._pos.pop()
+        self._committed.pop()
+        return type is _Backtrack
+
+    def __nonzero__(self):
+        return self._committed[-1]
+
+    __bool__ = __nonzero__
+
+class _Memo:
+    """
+    Packrat memo table for the rules marked with `_memoized`.
+
+    Entries are keyed by (rule, args, token position), so a rule that was
+    already tried at the same spot is not re-parsed when a sibling alternative
+    backtracks over it. The table is cleared after every committed top-level
+    declaration and whenever it grows past `limit` entries.
+
+    Only `expr` is memoized: `cast_expr` first tries `signal_type`, whose
+    array bounds are the expressions that the slice of the fallback
+    `member_expr` parses again at the same positions. Memoizing the other
+    rules costs more than the re-parsing it saves.
+    """
+    def __init__(self, limit=1<<16):
+        self.limit = limit
+        self.map = {}
+
+    def get(self, key):
+        return self.map.get(key)
+
+    def put(self, key, value):
+        if len(self.map) >= self.limit:
+            self.map.clear()
+        self.map[key] = value
+
+    def clear(self):
+        self.map.clear()
+
+_failed = object()
+
+# Rules whose results `_Parser.__call__` memoizes.
+_memoized_rules = set()
+
+def _memoized(rule):
+    _memoized_rules.add(rule)
+    return rule
+
+def newline(p):
+    return p.match('newline')
 
-def nl(p):
-    return p(r'(?:[ \t]*(?:#[^\n]*)?\n)+')
+def indent(p):
+    return p.match('indent')
 
-def ws(p):
-    return p(r'[ \t]*')
+def dedent(p):
+    return p.match('dedent')
 
-def ident(p):
-    return p('[a-zA-Z_][a-zA-Z_0-9]*')
+def eof(p):
+    return p.match('eof')
 
-def indent(p):
-    return p(r'[ \t]+')
+def ident(p):
+    return p.match('ident')
 
 def kw(p, name):
-    return p(name + r'(?![a-zA-Z_0-9])')
-
-_digits = {
-    '0': '0000',
-    '1': '0001',
-    '2': '0010',
-    '3': '0011',
-    '4': '0100',
-    '5': '0101',
-    '6': '0110',
-    '7': '0111',
-    '8': '1000',
-    '9': '1001',
-    'a': '1010',
-    'b': '1011',
-    'c': '1100',
-    'd': '1101',
-    'e': '1110',
-    'f': '1111',
-    'x': 'xxxx',
-    'z': 'zzzz',
-    '?': '????',
+    return p.match('ident', name)
+
+# For each base of a sized literal, the number of bits per digit and
+# tables that map its digits to the digits of the value, the x-mask and
+# the z-mask; digits missing from a table map to themselves. An x or z
+# digit has all of its value bits clear and a ? digit has them all set;
+# see `sized-num` in ast.py.
+def _sized_num_base(bits, ones):
+    return (bits,
+        {'x': '0', 'z': '0', '?': ones},
+        dict((c, ones if c == 'x' else '0') for c in '0123456789abcdefxz?'),
+        dict((c, ones if c in 'z?' else '0') for c in '0123456789abcdefxz?'))
+
+def _map_digits(digits, table):
+    # `str.translate` takes a dict only on Python 3.
+    return ''.join(table.get(c, c) for c in digits)
+
+_sized_num_bases = {
+    'b': (2,) + _sized_num_base(1, '1'),
+    'o': (8,) + _sized_num_base(3, '7'),
+    'h': (16,) + _sized_num_base(4, 'f'),
     }
 
+def _sized_num(size, base, digits):
+    if base == 'd':
+        return Node('sized-num', size=size, value=int(digits, 10) & ((1 << size) - 1), xmask=0, zmask=0)
+
+    radix, bits, value_table, xmask_table, zmask_table = _sized_num_bases[base]
+    value = int(_map_digits(digits, value_table), radix)
+    xmask = int(_map_digits(digits, xmask_table), radix)
+    zmask = int(_map_digits(digits, zmask_table), radix)
+
+    # As in Verilog, a literal with fewer digits than its size is extended
+    # with zeros, unless the leftmost digit is x, z or ?, in which case
+    # that digit is repeated.
+    width = len(digits) * bits
+    if width < size and digits[0] in 'xz?':
+        ext = ((1 << size) - 1) ^ ((1 << width) - 1)
+        if digits[0] == 'x':
+            xmask |= ext
+        else:
+            zmask |= ext
+            if digits[0] == '?':
+                value |= ext
+
+    mask = (1 << size) - 1
+    return Node('sized-num', size=size, value=value & mask, xmask=xmask & mask, zmask=zmask & mask)
+
 def num_expr(p):
-    v = p(r'-?[0-9]+')
-    with p:
-        size, v = int(v, 10), p('\'(?:b[01xz\?_]+|o[0-7xz\?_]+|d[0-9_]+|h[0-9a-fxz\?_]+)')
-        base = v[1]
-        v = v[2:].replace('_', '')
-        if base == 'o':
-            v = ''.join((digits[c][1:] for c in v))
-        elif base == 'h':
-            v = ''.join((digits[c] for c in v))
-        elif base == 'd':
-            v = bin(int(v, 10))
-        return Node('sized-num', size=size, v=v)
-    with p:
-        float_part = p(r'(?:\.[0-9]+(?:e[+-]?[0-9]+)?|(?:\.[0-9]+)?e[+-]?[0-9]+)')
-        return Node('num', value=float(v + float_part))
+    v = p.match('num')
+    if '\'' in v:
+        size, v = v.split('\'')
+        return _sized_num(int(size, 10), v[0], v[1:].replace('_', ''))
+    if '.' in v or 'e' in v:
+        return Node('num', value=float(v))
     return Node('num', value=int(v, 10))
 
 def atom_expr(p):
     with p:
         op = p('-')
-        p(ws)
         arg = p(cast_expr)
         return Node('unary-expr', op=op, arg=arg)
 
     with p:
         p(kw, 'not')
-        p(ws)
         arg = p(cast_expr)
         return Node('unary-expr', op='not', arg=arg)
 
@@ -81,118 +252,189 @@ def atom_expr(p):
         return Node('ref', name=p(ident))
 
     with p:
-        p(r'\{')
-        p(ws)
+        p('{')
         items = []
         with p:
             while True:
                 items.append(p(ident))
-                p(ws)
                 p.commit()
                 p(',')
-                p(ws)
-        p(r'\}')
+        p('}')
         return Node('set-expr', items=items)
 
-    p(r'\(')
-    p(ws)
-    r = p(expr)
-    p(ws)
-    p(r'\)')
+    p('(')
+    r = expr(p)
+    p(')')
     return r
 
-def fn_call(p):
-    fn = p(atom_expr)
+def member_expr(p):
+    # `atom_expr`, optionally followed by a call, then by a subscript or
+    # slice and then by a member access. The suffixes are parsed by one
+    # rule, so that a nested expression costs fewer stack frames.
+    e = atom_expr(p)
     with p:
-        p(ws)
-        p(r'\(')
-        p(ws)
+        p('(')
 
         args = []
         with p:
-            args.append(p(expr))
+            args.append(p(_inner_expr))
             while True:
-                p(ws)
                 p.commit()
                 p(',')
-                p(ws)
-                args.append(p(expr))
+                args.append(p(_inner_expr))
 
-        p(r'\)')
-        return Node('call-expr', fn=fn, args=args)
+        p(')')
+        e = Node('call-expr', fn=e, args=args)
 
-    return fn
-
-def slice_expr(p):
-    callee = p(fn_call)
     with p:
-        p(ws)
-        p(r'\[')
-        p(ws)
-        lower_bound = p(expr)
-        p(ws)
+        p('[')
+        lower_bound = p(_inner_expr)
         upper_bound = None
         with p:
             p(':')
-            p(ws)
-            upper_bound = p(expr)
-            p(ws)
-        p(r'\]')
+            upper_bound = p(_inner_expr)
+        p(']')
         if upper_bound is not None:
-            return Node('slice-expr', expr=callee, lower_bound=lower_bound, upper_bound=upper_bound)
+            e = Node('slice-expr', expr=e, lower_bound=lower_bound, upper_bound=upper_bound)
         else:
-            return Node('subscript-expr', expr=callee, IndexError=lower_bound)
-    return callee
+            e = Node('subscript-expr', expr=e, index=lower_bound)
 
-def member_expr(p):
-    container = p(slice_expr)
     with p:
-        p(ws)
-        p(r'\.')
-        p(ws)
+        p('.')
         name = p(ident)
-        return Node('member-expr', expr=container, member=name)
-    return container
+        e = Node('member-expr', expr=e, member=name)
+    return e
 
 def cast_expr(p):
     with p:
         type = p(signal_type)
         p('\'')
-        e = p(cast_expr)
+        e = cast_expr(p)
         return Node('cast-expr', type=type, expr=e)
-    return p(member_expr)
+    return member_expr(p)
+
+binary_op_prec = {
+    'or': 1,
+    'xor': 2,
+    'and': 3,
+    '==': 4,
+    '+': 5,
+    '-': 5,
+    '*': 6,
+    '/': 6,
+    }
+
+assoc_binary_ops = frozenset(('or', 'xor', 'and', '+', '*'))
 
-_binary_op = 'and', 'or', 'xor'
+def binary_op(p):
+    tok = p.peek()
+    if tok.value not in binary_op_prec or tok.kind != ('ident' if tok.value.isalpha() else 'op'):
+        p.error('binary operator')
+    return p.match(tok.kind)
+
+def _make_binary_expr(op, args):
+    # Pairs up neighbouring operands level by level, so that a run of n
+    # operands joined by the same associative operator produces a tree
+    # of depth log(n) rather than n.
+    while len(args) > 1:
+        r = []
+        for i in range(0, len(args) - 1, 2):
+            r.append(Node('binary-expr', lhs=args[i], rhs=args[i+1], op=op))
+        if len(args) % 2:
+            r.append(args[-1])
+        args = r
+    return args[0]
+
+# Runs of `+` and `-` with at most this many operands stay left-deep.
+# The nodes of longer runs are marked `_regrouped`, so that they are
+# still emitted in the order in which they were written.
+_left_deep_limit = 8
+
+_negated_ops = { '+': '-', '-': '+' }
+
+def _make_additive_expr(ops, args, regrouped=False):
+    # `args[0] ops[0] args[1] ops[1] ...`, where each op is `+` or `-`.
+    # Longer runs are split in halves; `l - (r)` negates the operators of
+    # the right half, since `a - b + c` is `a - (b - c)`.
+    if len(args) <= _left_deep_limit:
+        return _make_left_deep_expr(ops, args, regrouped)
+    mid = len(args) // 2
+    lhs = _make_additive_expr(ops[:mid-1], args[:mid], True)
+    op = ops[mid-1]
+    rhs_ops = ops[mid:]
+    if op == '-':
+        rhs_ops = [_negated_ops[rhs_op] for rhs_op in rhs_ops]
+    rhs = _make_additive_expr(rhs_ops, args[mid:], True)
+    return Node('binary-expr', lhs=lhs, rhs=rhs, op=op, _regrouped=True)
+
+def _make_left_deep_expr(ops, args, regrouped=False):
+    cur = args[0]
+    for op, arg in zip(ops, args[1:]):
+        cur = Node('binary-expr', lhs=cur, rhs=arg, op=op)
+        if regrouped:
+            cur._regrouped = True
+    return cur
+
+def _make_run_expr(ops, args):
+    # Builds the tree of a run of operators of the same precedence.
+    if all(op == ops[0] for op in ops) and ops[0] in assoc_binary_ops:
+        return _make_binary_expr(ops[0], args)
+    if all(op in _negated_ops for op in ops):
+        return _make_additive_expr(ops, args)
+    return _make_left_deep_expr(ops, args)
 
 def expr(p):
-    lhs = p(cast_expr)
-    with p:
-        p(ws)
-        for bin_op in _binary_op:
-            with p:
-                op = p(kw, bin_op)
-                break
+    """
+    Parses `cast_expr (op cast_expr)*` in a single pass and builds the tree
+    by precedence climbing on an explicit stack. All binary operators are
+    left-associative; runs of the same associative operator, and long runs
+    of `+` and `-`, are balanced.
+    """
+    stack = []
+    cur = cast_expr(p)
+    while True:
+        with p:
+            op = p(binary_op)
+            rhs = cast_expr(p)
+        if not p:
+            break
+
+        prec = binary_op_prec[op]
+        while stack and stack[-1][0] > prec:
+            top_prec, top_ops, top_args = stack.pop()
+            top_args.append(cur)
+            cur = _make_run_expr(top_ops, top_args)
+
+        if stack and stack[-1][0] == prec:
+            stack[-1][1].append(op)
+            stack[-1][2].append(cur)
         else:
-            op = p(r'(?:==|[+\-*/])')
-        p(ws)
-        rhs = p(expr)
-        return Node('binary-expr', lhs=lhs, rhs=rhs, op=op)
-    return lhs
+            stack.append((prec, [op], [cur]))
+        cur = rhs
+
+    while stack:
+        top_prec, top_ops, top_args = stack.pop()
+        top_args.append(cur)
+        cur = _make_run_expr(top_ops, top_args)
+    return cur
+
+@_memoized
+def _inner_expr(p):
+    # An expression in brackets or in the parentheses of a call, which
+    # `cast_expr` may parse twice: once as part of a `signal_type` that
+    # turns out not to be followed by a cast, and once more as part of
+    # the `member_expr` it falls back to.
+    return expr(p)
 
 def array_bounds(p):
     bounds = []
     with p:
         while True:
-            p(ws)
-            p(r'\[')
-            p(ws)
-            left_bound = p(expr)
-            p(ws)
+            p('[')
+            left_bound = p(_inner_expr)
             p(':')
-            p(ws)
-            right_bound = p(expr)
-            p(ws)
-            p(r'\]')
+            right_bound = p(_inner_expr)
+            p(']')
             bounds.append((left_bound, right_bound))
             p.commit()
     return bounds
@@ -200,26 +442,21 @@ def array_bounds(p):
 def generic_arg(p):
     with p:
         param_name = p(ident)
-        p(ws)
         p('=')
-        p(ws)
-        value = p(expr)
+        value = p(_inner_expr)
         return Node('arg', kw_name=param_name, value=value)
-    return Node('arg', kw_name=None, value=p(expr))
+    return Node('arg', kw_name=None, value=p(_inner_expr))
 
 def generic_args(p):
-    p(r'\(')
-    p(ws)
+    p('(')
     r = []
     with p:
         r.append(p(generic_arg))
         while True:
-            p(ws)
             p.commit()
             p(',')
-            p(ws)
             r.append(p(generic_arg))
-    p(r'\)')
+    p(')')
     return r
 
 def simple_type(p):
@@ -227,12 +464,9 @@ def simple_type(p):
     if len(name) == 1 and name[0] == 'bit':
         return Node('bit-type')
     if name == 'set':
-        p(ws)
-        p(r'\(')
-        p(ws)
+        p('(')
         enum_type = p(ident)
-        p(ws)
-        p(r'\)')
+        p(')')
         return Node('set-type', enum=enum_type)
     gen_args = []
     with p:
@@ -249,9 +483,7 @@ def signal_type(p):
 def _member_decl(p):
     name = p(ident)
     with p:
-        p(ws)
         p(':')
-        p(ws)
         type = p(signal_type)
         return name, type
     bounds = p(array_bounds)
@@ -262,16 +494,13 @@ def _member_decl(p):
 
 def port_decl(p):
     dir = p(ident)
-    p(ws)
     name, type = p(_member_decl)
     return Node('port', dir=dir, name=name, type=type)
 
 def generic_param(p):
     name = p(ident)
     with p:
-        p(ws)
         p(':')
-        p(ws)
         type = p(signal_type)
         return name, type
     return name, Node('auto-type')
@@ -279,66 +508,50 @@ def generic_param(p):
 def generic_decl(p):
     r = []
     with p:
-        p('\(')
-        p(ws)
+        p('(')
         with p:
             r.append(p(generic_param))
             while True:
-                p(ws)
                 p.commit()
                 p(',')
-                p(ws)
                 r.append(p(generic_param))
-        p('\)')
+        p(')')
     return r
 
-def _indent(p):
-    return p(p.get('indent', ''))
-
 def _indented(p, stmt):
-    p(nl)
-    cur = p(_indent)
-    new = p(indent)
+    p(newline)
+    p(indent)
+    r = []
     with p:
-        cur = cur + new
-        p.set('indent', cur)
-
-        r = []
-        with p:
+        r.append(p(stmt))
+        while True:
+            p.commit()
+            p(newline)
             r.append(p(stmt))
-            while True:
-                p.commit()
-                p(nl)
-                p(cur)
-                r.append(p(stmt))
-        return r
-    return []
+    p(dedent)
+    return r
 
 def line_enumers(p):
     r = [p(ident)]
     with p:
         while True:
-            p(ws)
             p(',')
-            p(ws)
             r.append(p(ident))
             p.commit()
-    with p:
-        p(ws)
-        p(',')
+    p.opt(',')
     return r
 
 def assign_stmt(p):
     lhs = p(expr)
-    p(ws)
-    op = p(r'(?:\<=|=)')
-    p(ws)
+    with p:
+        op = p('<=')
+    if not p:
+        op = p('=')
     rhs = p(expr)
     return Node('assign-stmt', lhs=lhs, rhs=rhs, delayed=op == '<=')
 
 def switch_case(p):
     value = p(expr)
-    p(ws)
     p(':')
     body = p(_indented, seq_stmt)
     return Node('case-stmt', value=value, body=body)
@@ -346,38 +559,30 @@ def switch_case(p):
 def seq_stmt(p):
     with p:
         p(kw, 'wait')
-        p(ws)
         e = p(expr)
         return Node('wait-stmt', expr=e)
 
     with p:
         p(kw, 'assert')
-        p(ws)
         e = p(expr)
         return Node('assert-stmt', expr=e)
 
     with p:
         p(kw, 'switch')
-        p(ws)
         value = p(expr)
-        p(ws)
         p(':')
         cases = p(_indented, switch_case)
         return Node('switch-stmt', value=value, cases=cases)
 
     with p:
         p(kw, 'if')
-        p(ws)
         cond = p(expr)
-        p(ws)
         p(':')
         true_body = p(_indented, seq_stmt)
         false_body = None
         with p:
-            p(nl)
-            p(_indent)
+            p(newline)
             p(kw, 'else')
-            p(ws)
             p(':')
             false_body = p(_indented, seq_stmt)
         return Node('if-stmt', cond=cond, true_body=true_body, false_body=false_body)
@@ -386,9 +591,7 @@ def seq_stmt(p):
 
 def port_map(p):
     target = p(expr)
-    p(ws)
-    p(r'\<=')
-    p(ws)
+    p('<=')
     source = p(expr)
     return Node('port_map', target=target, source=source)
 
@@ -399,37 +602,30 @@ def edge_spec(p):
     if not p:
         p(kw, 'negedge')
         rising = False
-    p(ws)
     edge = p(ident)
     return Node('edgespec', rising=rising, name=edge)
 
 def def_decl(p):
     with p:
         p(kw, 'sig')
-        p(ws)
         name, type = p(_member_decl)
         return Node('signal', name=name, type=type)
     with p:
         p(kw, 'always')
-        p(ws)
         p(':')
         body = p(_indented, seq_stmt)
         return Node('always', body=body)
     with p:
         p(kw, 'test')
-        p(ws)
         p(':')
         body = p(_indented, seq_stmt)
         return Node('test', body=body)
     with p:
         p(kw, 'on')
-        p(ws)
         specs = [p(edge_spec)]
         with p:
             while True:
-                p(ws)
                 p(kw, 'or')
-                p(ws)
                 specs.append(p(edge_spec))
                 p.commit()
         p(':')
@@ -437,19 +633,18 @@ def def_decl(p):
         return Node('on', specs=specs, body=body)
 
     p(kw, 'inst')
-    p(ws)
     name = p(ident)
-    p(ws)
     p(':')
-    p(ws)
     mod = p(ident)
+    gen_args = []
+    with p:
+        gen_args = p(generic_args)
     pms = p(_indented, port_map)
-    return Node('inst', name=name, module=mod, port_maps=pms)
+    return Node('inst', name=name, module=mod, args=gen_args, port_maps=pms)
 
 def intf_decl(p):
     with p:
         p(kw, 'use')
-        p(ws)
         type = p(simple_type)
         return Node('use', type=type)
 
@@ -460,13 +655,9 @@ def struct_member(p):
     return Node('port', dir='o', name=name, type=type)
 
 def top_decl(p):
-    p(_indent)
-
     with p:
         p(kw, 'interface')
-        p(ws)
         name = p(ident)
-        p(ws)
         gen_args = p(generic_decl)
         p(':')
         decls = p(_indented, intf_decl)
@@ -474,9 +665,7 @@ def top_decl(p):
 
     with p:
         p(kw, 'struct')
-        p(ws)
         name = p(ident)
-        p(ws)
         gen_args = p(generic_decl)
         p(':')
         members = p(_indented, struct_member)
@@ -484,9 +673,7 @@ def top_decl(p):
 
     with p:
         p(kw, 'enum')
-        p(ws)
         name = p(ident)
-        p(ws)
         p(':')
         enumers = []
         for e in p(_indented, line_enumers):
@@ -495,7 +682,6 @@ def top_decl(p):
 
     with p:
         p(kw, 'module')
-        p(ws)
         name = p(ident)
         gen_args = p(generic_decl)
         p(':')
@@ -503,11 +689,9 @@ def top_decl(p):
         return Node('module', name=name, params=gen_args, ports=ports)
 
     p(kw, 'def')
-    p(ws)
     declare = False
     with p:
         p(kw, 'module')
-        p(ws)
         declare = True
     name = p(ident)
     p(':')
@@ -515,25 +699,179 @@ def top_decl(p):
     return Node('def', name=name, declare=declare, decls=decls)
 
 def unit(p):
-    p.opt(nl)
-    p.set('indent', '')
     decls = []
     with p:
         while True:
-            decls.append(p(top_decl))
+            start = p.pos()
+            decl = p(top_decl)
+            decl._digest = p.digest(start)
+            decls.append(decl)
             p.commit()
-            p(nl)
-    p.opt(nl)
-    p(p.eof)
+            if p.memo is not None:
+                p.memo.clear()
+            p(newline)
+    p.opt(newline)
+    p(eof)
     return Node('unit', decls=decls)
 
-def parse(fin, name=None):
+def _parse(tokens, rule, memoize=True):
+    p = _Parser(tokens, _Memo() if memoize else None)
+    try:
+        return p(rule)
+    except _Backtrack:
+        pass
+    raise p.parse_error()
+
+def _grammar_version():
+    # Cached ASTs are only valid for the lexer, grammar and node classes that
+    # produced them, so the cache key includes a hash of their sources.
+    return _sources_version('ast.py', 'lexer.py', 'parser.py')
+
+def _sources_version(*fnames):
+    this_dir = os.path.dirname(os.path.abspath(__file__))
+    parts = []
+    for fname in fnames:
+        try:
+            with open(os.path.join(this_dir, fname), 'rb') as fin:
+                parts.append(fin.read())
+        except IOError:
+            parts.append(fname)
+    return DiskCache.key(*parts)
+
+_ast_version = None
+
+def _cache_key(text):
+    global _ast_version
+    if _ast_version is None:
+        _ast_version = _grammar_version()
+    return DiskCache.key('ast', _ast_version, text)
+
+def _file_name(fname):
+    return os.path.splitext(os.path.split(fname)[1])[0]
+
+def parse_text(text, line=1, memoize=True, cache=None):
+    """
+    Parses the source `text`, whose first line is numbered `line`, into
+    a `unit` node. If `cache` is a `DiskCache`, the AST is looked up by
+    the hash of `text` and stored there after a miss.
+    """
+    r = None
+    if cache is not None:
+        key = _cache_key(text)
+        r = cache.get(key)
+
+    if r is None:
+        r = _parse(tokenize(text, line), unit, memoize=memoize)
+        if cache is not None:
+            cache.put(key, r)
+    return r
+
+def parse(fin, name=None, memoize=True, cache=None):
     if name is None:
-        name = os.path.split(fin.name)[1]
-        name = os.path.splitext(name)[0]
-    r = speg.peg(fin.read().replace('\r', ''), unit)
+        name = _file_name(fin.name)
+    r = parse_text(fin.read().replace('\r', ''), memoize=memoize, cache=cache)
     r.name = name
     return r
 
+def parse_file(fname, cache=None):
+    with open(fname, 'r') as fin:
+        try:
+            return parse(fin, cache=cache)
+        except ParseError as e:
+            e.fname = fname
+            raise
+
+_top_line_re = re.compile(r'^[^ \t#\n]', re.M)
+
+def chunk_end(text, pos):
+    """
+    Returns the offset of the first line after `pos` that starts
+    in the first column, or the length of `text`.
+    """
+    m = _top_line_re.search(text, pos + 1)
+    return m.start() if m is not None else len(text)
+
+def split_unit(text):
+    """
+    Splits the source `text` before every line that starts in the first
+    column, i.e. before every top-level declaration. Blank and comment lines
+    stay with the preceding declaration. Returns a list of
+    `(first_line, chunk)` pairs; parsing each chunk with
+    `tokenize(chunk, first_line)` yields the declarations of `text`
+    with the same locations.
+    """
+    chunks = []
+    start = 0
+    line = 1
+    for m in _top_line_re.finditer(text):
+        if m.start() == 0:
+            continue
+        chunks.append((line, text[start:m.start()]))
+        line += text.count('\n', start, m.start())
+        start = m.start()
+    chunks.append((line, text[start:]))
+    return chunks
+
+def _parse_chunk_worker(chunk):
+    fname, line, text = chunk
+    try:
+        return parse_text(text, line).decls
+    except ParseError as e:
+        e.fname = fname
+        raise
+
+def _parse_files_pool(fnames, cache, jobs, split):
+    # The cache is only consulted and filled here, in the parent, so that
+    # the units of a `MemoryCache` are the ones that later builds get back.
+    # The workers only parse the texts that missed, whole or in chunks.
+    units = [None] * len(fnames)
+    pending = []
+    chunks = []
+    for i, fname in enumerate(fnames):
+        with open(fname, 'r') as fin:
+            text = fin.read().replace('\r', '')
+        if cache is not None:
+            key = _cache_key(text)
+            units[i] = cache.get(key)
+            if units[i] is not None:
+                continue
+        else:
+            key = None
+        file_chunks = split_unit(text) if split else [(1, text)]
+        pending.append((i, key, len(file_chunks)))
+        chunks.extend((fname, line, chunk) for line, chunk in file_chunks)
+
+    if chunks:
+        pool = multiprocessing.Pool(jobs or None)
+        try:
+            results = iter(pool.map(_parse_chunk_worker, chunks, chunksize=None if split else 1))
+        finally:
+            pool.close()
+            pool.join()
+
+    for i, key, chunk_count in pending:
+        decls = []
+        for _ in range(chunk_count):
+            decls.extend(next(results))
+        units[i] = Node('unit', decls=decls)
+        if cache is not None:
+            cache.put(key, units[i])
+
+    for fname, unit in zip(fnames, units):
+        unit.name = _file_name(fname)
+    return units
+
+def parse_files(fnames, cache=None, jobs=1, split=False):
+    """
+    Parses the files `fnames` and returns their units in the same order.
+    With `jobs` other than 1, the files that are not in `cache` are parsed
+    by a pool of that many worker processes (or one per CPU if `jobs` is
+    0 or None). If `split` is set, each file is cut by `split_unit` and its
+    top-level declarations are distributed over the pool separately.
+    """
+    if jobs == 1 or (len(fnames) < 2 and not split):
+        return [parse_file(fname, cache=cache) for fname in fnames]
+    return _parse_files_pool(fnames, cache, jobs, split)
+
 def parse_type(s):
-    return speg.peg(s, simple_type)
+    return _parse(tokenize(s), simple_type)
@@ -1,26 +1,198 @@
-﻿from .parser import parse_type
-from .eval import eval_int_expr
+﻿import re, hashlib
+from collections import OrderedDict
+from .parser import parse_type, _sources_version
+from .cache import DiskCache
+from .eval import eval_int_expr, fold_int_expr
 from .ast import Node
 
 class Scope:
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, loader=None):
         self.parent = parent
-        self.map = {}
+        # Ordered, so that the tops are elaborated and emitted in the order
+        # of their declaration on Python 2 as well.
+        self.map = OrderedDict()
+        self.loader = loader
 
     def add(self, name, node):
         self.map[name] = node
 
     def lookup(self, name, kind=None):
-        r = self.map.get(name)
-        if r is not None:
-            return r if not kind is None or r.kind != kind else None
-        if self.parent:
-            return self.parent.lookup(name, kind=kind)
+        scope = self
+        while True:
+            r = scope.map.get(name)
+            if r is not None:
+                return r if not kind is None or r.kind != kind else None
+            if scope.parent is None:
+                break
+            scope = scope.parent
+        if scope.loader is not None and scope.loader(name):
+            return scope.lookup(name, kind=kind)
         return None
 
     def items(self):
         return self.map.items()
 
+class Frame:
+    """
+    The values of a declaration's symbols in one of its instances.
+
+    Sema numbers the parameters, ports and def-local signals and instances
+    of every module (and the parameters of every interface) and stores the
+    numbers in `decl.symbols`; every `ref` to one of them gets the number
+    in `ref.slot`. Elaboration then finds the referenced value with a list
+    index. `lookup` by name remains for refs that sema did not bind,
+    which resolve in the root scope.
+    """
+    def __init__(self, symbols, values, root, args=(), int_memo=None):
+        self.symbols = symbols
+        self.values = values
+        self.root = root
+        self.args = args
+        self.int_memo = int_memo
+
+    def get(self, slot):
+        return self.values[slot]
+
+    def set(self, name, value):
+        self.values[self.symbols[name]] = value
+
+    def lookup(self, name, kind=None):
+        slot = self.symbols.get(name)
+        if slot is not None and slot < len(self.values) and self.values[slot] is not None:
+            return self.values[slot]
+        return self.root.lookup(name, kind=kind)
+
+    def extend(self, symbols):
+        values = list(self.values)
+        values.extend([None] * (len(symbols) - len(values)))
+        return Frame(symbols, values, self.root, self.args, self.int_memo)
+
+# Attributes through which `ref` nodes can be reached from a type, statement
+# or expression.
+_child_attrs = {
+    'array-type': ('subtype', 'left_bound', 'right_bound'),
+    'struct-type': ('args',),
+    'arg': ('value',),
+    'assign-stmt': ('lhs', 'rhs'),
+    'switch-stmt': ('value', 'cases'),
+    'case-stmt': ('value', 'body'),
+    'if-stmt': ('cond', 'true_body', 'false_body'),
+    'wait-stmt': ('expr',),
+    'assert-stmt': ('expr',),
+    'binary-expr': ('lhs', 'rhs'),
+    'unary-expr': ('arg',),
+    'cast-expr': ('type', 'expr'),
+    'member-expr': ('expr',),
+    'slice-expr': ('expr', 'lower_bound', 'upper_bound'),
+    'subscript-expr': ('expr', 'index'),
+    'call-expr': ('fn', 'args'),
+    }
+
+# Attributes holding integer expressions, whose constant parts are folded
+# while the refs are bound.
+_int_attrs = {
+    'array-type': ('left_bound', 'right_bound'),
+    'slice-expr': ('lower_bound', 'upper_bound'),
+    'arg': ('value',),
+    }
+
+def _walk(nodes):
+    # Yields the nodes reachable from `nodes` through `_child_attrs`.
+    # The children of a node are read after it has been yielded, so the
+    # caller may replace them.
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, Node):
+            yield node
+            for attr in _child_attrs.get(node.kind, ()):
+                stack.append(getattr(node, attr))
+
+def _bind_refs(symbols, nodes):
+    for node in _walk(nodes):
+        if node.kind == 'ref':
+            node.slot = symbols.get(node.name)
+        else:
+            for attr in _int_attrs.get(node.kind, ()):
+                setattr(node, attr, fold_int_expr(getattr(node, attr)))
+
+def _ref_slots(node):
+    slots = set()
+    for child in _walk([node]):
+        if child.kind == 'ref':
+            slot = getattr(child, 'slot', None)
+            if slot is not None:
+                slots.add(slot)
+    return tuple(sorted(slots))
+
+def _slot_key(value):
+    # Two values with the same key elaborate the refs to them the same way.
+    if value.kind == 'num':
+        return 'num', value.value
+    if value.kind == 'port':
+        return 'port', value.dir, value.name, value.type
+    if value.kind == 'signal':
+        return 'signal', value.name, value.type
+    if value.kind == 'inst-inst':
+        return 'inst-inst', value.name, value.module
+    return value
+
+def _inst_name(name, args):
+    return name + '__' + re.sub('[^a-zA-Z0-9_]', '_', '_'.join([str(arg) for arg in args]))
+
+def _decl_digest(decl):
+    # A module's digest covers its header and all of its defs.
+    if decl.kind == 'module':
+        parts = [getattr(decl, '_digest', None)] + [getattr(mod_def, '_digest', None) for mod_def in decl.defs]
+        if any(part is None for part in parts):
+            return None
+        return DiskCache.key(*parts)
+    return getattr(decl, '_digest', None)
+
+def _dep_digests(decls):
+    # -> sorted [(kind, name, digest)], or None if a declaration has no digest
+    r = []
+    for decl in decls:
+        digest = _decl_digest(decl)
+        if digest is None:
+            return None
+        r.append((decl.kind, decl.name, digest))
+    r.sort()
+    return r
+
+_output_version = None
+
+def _module_cache_key(mod, arg_values):
+    global _output_version
+    digest = _decl_digest(mod)
+    if digest is None:
+        return None
+    if _output_version is None:
+        _output_version = _sources_version('ast.py', 'lexer.py', 'parser.py', 'eval.py', 'sema.py', 'gen_verilog.py')
+    return DiskCache.key('module', _output_version, mod.name, repr(arg_values), digest)
+
+def _set_symbols(decl, symbols):
+    # Returns False if `decl` is already bound to an equal symbol table,
+    # as the declarations of an unchanged file are when a build reuses
+    # their AST.
+    if getattr(decl, 'symbols', None) == symbols:
+        return False
+    decl.symbols = symbols
+    return True
+
+def _make_symbols(names, base=None):
+    # Numbers `names` after those of `base`. A name may be declared once
+    # among a declaration's parameters, ports and def-local signals and
+    # instances, as in the Verilog it is translated to.
+    r = dict(base) if base is not None else {}
+    for name in names:
+        if name in r:
+            raise RuntimeError('duplicate declaration: ' + name)
+        r[name] = len(r)
+    return r
+
 def _resolve_type(scope, type):
     if type.kind == 'array-type':
         _resolve_type(scope, type.subtype)
@@ -39,81 +211,420 @@ def _resolve_type(scope, type):
             raise RuntimeError('expected type, found ' + type.name)
         type.decl = decl
 
-def sema(units):
+def _index_ports(ports):
+    # The first of several ports with the same name wins, as it did when
+    # the ports were searched linearly.
+    r = {}
+    for port in ports:
+        r.setdefault(port.name, port)
+    return r
+
+def _declare(scope, decl):
+    if decl.kind in ('interface', 'enum', 'module'):
+        scope.add(decl.name, decl)
+        decl.scope = Scope(parent=scope)
+    if decl.kind == 'enum':
+        decl.enumer_indexes = {}
+        for i, enumer in enumerate(decl.enumers):
+            decl.enumer_indexes.setdefault(enumer, i)
+        # The number of bits of the enum's encoding, ceil(log2(n)).
+        decl.width = (len(decl.enumers) - 1).bit_length()
+    elif decl.kind == 'interface':
+        if _set_symbols(decl, _make_symbols(name for name, type in decl.params)):
+            _bind_refs(decl.symbols, [mem.type for mem in decl.decls])
+    elif decl.kind == 'module':
+        for port in decl.ports:
+            decl.scope.add(port.name, port)
+        decl.defs = []
+        if _set_symbols(decl, _make_symbols([name for name, type in decl.params] + [port.name for port in decl.ports])):
+            _bind_refs(decl.symbols, [port.type for port in decl.ports])
+
+def _resolve(scope, decl):
+    if decl.kind == 'interface':
+        for mem in decl.decls:
+            _resolve_type(decl.scope, mem.type)
+            if mem.kind == 'use' and mem.type.kind != 'struct-type':
+                raise RuntimeError('use directive must refer to an interface')
+    elif decl.kind == 'module':
+        for port in decl.ports:
+            _resolve_type(decl.scope, port.type)
+    elif decl.kind == 'def':
+        mod = scope.lookup(decl.name, 'module')
+        mod.defs.append(decl)
+        decl.mod = mod
+        decl.scope = Scope(parent=mod.scope)
+        for def_decl in decl.decls:
+            if def_decl.kind in ('signal', 'inst'):
+                decl.scope.add(def_decl.name, def_decl)
+        for def_decl in decl.decls:
+            if def_decl.kind in 'signal':
+                _resolve_type(decl.scope, def_decl.type)
+
+        if not _set_symbols(decl, _make_symbols((def_decl.name for def_decl in decl.decls if def_decl.kind in ('signal', 'inst')), mod.symbols)):
+            return
+        for def_decl in decl.decls:
+            if def_decl.kind == 'signal':
+                _bind_refs(decl.symbols, [def_decl.type])
+            elif def_decl.kind == 'inst':
+                _bind_refs(decl.symbols, def_decl.args + [pm.source for pm in def_decl.port_maps])
+            else:
+                _bind_refs(decl.symbols, def_decl.body)
+
+def _load(scope, index, name, kinds=None):
+    decls = index.load(name, kinds)
+    for decl in decls:
+        _declare(scope, decl)
+    for decl in decls:
+        _resolve(scope, decl)
+    return bool(decls)
+
+def sema(units, index=None):
+    """
+    Declares and resolves all declarations of `units` and returns the root
+    scope. If a `DeclIndex` is given, names missing from the root scope are
+    looked up in it and their declarations are loaded on first use.
+    """
     ctx = Scope()
+    # Kept for `update`.
+    ctx.units = list(units)
+    ctx.index = index
     for unit in units:
         unit.scope = ctx
         for decl in unit.decls:
-            if decl.kind in ('interface', 'enum', 'module'):
-                unit.scope.add(decl.name, decl)
-                decl.scope = Scope(parent=unit.scope)
-            if decl.kind == 'module':
-                for port in decl.ports:
-                    decl.scope.add(port.name, port)
-                decl.defs = []
+            _declare(ctx, decl)
+
+    if index is not None:
+        ctx.loader = lambda name: _load(ctx, index, name)
+        for name, decl in list(ctx.items()):
+            if decl.kind == 'module' and name in index:
+                _load(ctx, index, name, kinds=('def',))
 
     for unit in units:
         for decl in unit.decls:
-            if decl.kind == 'interface':
-                for mem in decl.decls:
-                    _resolve_type(decl.scope, mem.type)
-                    if mem.kind == 'use' and mem.type.kind != 'struct-type':
-                        raise RuntimeError('use directive must refer to an interface')
-            elif decl.kind == 'module':
-                for port in decl.ports:
-                    _resolve_type(decl.scope, port.type)
-            elif decl.kind == 'def':
-                mod = ctx.lookup(decl.name, 'module')
-                mod.defs.append(decl)
-                decl.mod = mod
-                decl.scope = Scope(parent=mod.scope)
-                for def_decl in decl.decls:
-                    if def_decl.kind in ('signal', 'inst'):
-                        decl.scope.add(def_decl.name, def_decl)
-                for def_decl in decl.decls:
-                    if def_decl.kind in 'signal':
-                        _resolve_type(decl.scope, def_decl.type)
+            _resolve(ctx, decl)
 
     return ctx
 
+def update(ctx, units):
+    """
+    Updates the root scope `ctx` that `sema` returned to `units`, which
+    share most of their unit nodes with those it was given, as the builds
+    of --watch do. Only the declarations of the new units, and the defs
+    of the modules that they add or extend, are resolved.
+
+    Returns False, leaving `ctx` alone, unless the units that were added
+    or removed only declare modules and defs whose names are declared by
+    one module each and not by the library.
+    """
+    old_units = set(ctx.units)
+    new_units = set(units)
+    removed = [decl for unit in ctx.units if unit not in new_units for decl in unit.decls]
+    added = [decl for unit in units if unit not in old_units for decl in unit.decls]
+    if any(decl.kind not in ('module', 'def') for decl in removed + added):
+        return False
+    names = set(decl.name for decl in removed + added)
+
+    mods = {}
+    for unit in units:
+        for decl in unit.decls:
+            if decl.kind != 'def' and decl.name in names:
+                if decl.kind != 'module' or decl.name in mods:
+                    return False
+                mods[decl.name] = decl
+    index = ctx.index
+    if index is not None:
+        if any(name in index for name in names):
+            return False
+        if any(decl.name in names for unit in index.units.values() for decl in unit.decls):
+            return False
+
+    for decl in removed:
+        if decl.kind == 'module':
+            del ctx.map[decl.name]
+    for unit in units:
+        if unit not in old_units:
+            unit.scope = ctx
+    for decl in added:
+        if decl.kind == 'module':
+            _declare(ctx, decl)
+    for name, mod in mods.items():
+        mod.defs = []
+
+    # The defs of a module are collected in the order of the units, as
+    # `sema` does; those that did not change keep their symbols.
+    added = set(added)
+    for unit in units:
+        for decl in unit.decls:
+            if decl.name in names and (decl.kind == 'def' or decl in added):
+                _resolve(ctx, decl)
+    ctx.units = list(units)
+    return True
+
 class Context:
-    def __init__(self, units, root_scope):
+    """
+    Elaborates module instances.
+
+    If `on_module` is given, it is called with each distinct module
+    instance as soon as the instance and all of its submodules are
+    elaborated, so that children are reported before their parents.
+    The instance's decls are released afterwards, together with the
+    memos that would keep them alive; only its name and ports, which its
+    parents still refer to, remain.
+
+    `touched` collects the modules, defs, interfaces and enums that the
+    elaboration depended on.
+
+    `module_template`, such as `gen_verilog.module_template`, returns the
+    text of a module instance with placeholders for its own name and
+    those of its submodules, and the instances of the submodules.
+    Instances of a module whose templates are the same are merged; only
+    a hash of each template is kept, and the text is generated again
+    when the modules are written.
+
+    If `cache` is also given, each template is stored there, together
+    with the instances of its submodules and the hashes of all
+    declarations it transitively depends on. A later instantiation with
+    the same module, args and declarations only elaborates the instance's
+    ports and keeps the template from the cache in `mod_inst.template`
+    and its submodules in `mod_inst.submodules`. `cached_modules` and
+    `stale_modules` count the entries that were used and those whose
+    declarations had changed.
+
+    `previous` may be the context of an earlier build whose `root_scope`
+    was the same or was brought up to date by `update`, as in --watch.
+    Module instances none of whose declarations changed since are taken
+    from it together with their submodules, without elaborating them
+    again; `reused_modules` counts them. This needs `module_template` and
+    no `on_module`, which releases the instances it is given.
+    """
+    def __init__(self, units, root_scope, on_module=None, cache=None, module_template=None, previous=None):
         self.units = units
-        self._root_scope = root_scope
+        self.root_scope = root_scope
+        self._on_module = on_module
+        self._module_template = module_template
+        self._cache = cache if module_template is not None else None
+        self.cached_modules = 0
+        self.stale_modules = 0
+        self.reused_modules = 0
+        self.touched = set()
+        self._deps = []
+        self._inst_deps = {}
         self._intfs = {}
-        self._modules = {}
+        self._modules = OrderedDict()
 
         self._active_intf_insts = set()
         self._active_mod_insts = set()
 
+        self._types = {}
+        self._int_exprs = {}
+
+        self._ref_slots = {}
+        self._shared = {}
+        self.shared_nodes = 0
+
+        self._module_bodies = {}
+        self._named_modules = set()
+
+        # For each (name, args) instantiated: the key of its body in
+        # `_module_bodies`, its module cache key, the declarations it
+        # depends on and the defs of those that are modules.
+        self._bodies = {}
+        self._previous_bodies = {}
+        self._previous_modules = {}
+        if previous is not None and on_module is None and module_template is not None:
+            self._previous_bodies = previous._bodies
+            self._previous_modules = previous._modules
+            # The types of reused instances must be the ones that this
+            # context interns.
+            self._types.update(previous._types)
+        self._int_type = self._intern_type('int-type')
+        self._arith_type = self._intern_type('arith-type')
+        self._atom_type = self._intern_type('atom-type')
+        self._set_lit_type = self._intern_type('set-lit-type')
+        self._x_type = self._intern_type('x-type')
+
     def all_modules(self):
-        return self._modules.values()
+        seen = set()
+        r = []
+        for mod_inst in self._modules.values():
+            if mod_inst not in seen:
+                seen.add(mod_inst)
+                r.append(mod_inst)
+        return r
 
     def instantiate_module(self, scope, module_name, args):
-        mod = self._root_scope.lookup(module_name, 'module')
-        if mod is None:
+        mod = self.root_scope.lookup(module_name, 'module')
+        if mod is None or mod.kind != 'module':
             raise RuntimeError('unknown module: ' + module_name)
 
         arg_values = self._match_args(scope, mod.params, args)
-
-        mod_inst_spec = (module_name, tuple(arg_values))
-        if mod_inst_spec in self._active_intf_insts:
+        return self._instantiate_module(mod, tuple(arg_values))
+
+    def _touch(self, decl):
+        self.touched.add(decl)
+        if decl.kind == 'module':
+            self.touched.update(decl.defs)
+        if self._deps:
+            self._deps[-1].add(decl)
+
+    def _add_deps(self, inst_spec):
+        # Adds the dependencies of an already elaborated instance to those
+        # of the instance being elaborated.
+        deps = self._inst_deps.get(inst_spec)
+        if deps is not None and self._deps:
+            self._deps[-1].update(deps)
+
+    def _instantiate_module(self, mod, arg_values):
+        self._touch(mod)
+
+        mod_inst_spec = (mod.name, arg_values)
+        if mod_inst_spec in self._active_mod_insts:
             raise RuntimeError('recursive instantiation')
 
         if mod_inst_spec in self._modules:
+            self._add_deps(mod_inst_spec)
             return self._modules[mod_inst_spec]
 
-        mod_inst = Node('module-inst', specs=(mod, tuple(arg_values)))
+        if mod_inst_spec in self._previous_bodies:
+            mod_inst = self._reuse_module(mod_inst_spec)
+            if mod_inst is not None:
+                return mod_inst
+
+        mod_inst = Node('module-inst', specs=(mod, arg_values), template=None)
         self._active_mod_insts.add(mod_inst_spec)
         self._modules[mod_inst_spec] = mod_inst
-        self._inst_module(mod_inst)
+        self._deps.append(set([mod]))
+
+        cache_key = entry = None
+        if self._cache is not None:
+            cache_key = _module_cache_key(mod, arg_values)
+            if cache_key is not None:
+                entry = self._cached_module(cache_key)
+        if entry is not None:
+            template, submodule_specs, dep_decls = entry
+            self._inst_ports(mod_inst)
+            submodules = [self._instantiate_module(self.root_scope.lookup(name, 'module'), args) for name, args in submodule_specs]
+            for decl in dep_decls:
+                self._touch(decl)
+        else:
+            self._inst_module(mod_inst)
+            if self._module_template is not None:
+                template, submodules = self._module_template(mod_inst)
+
+        deps = self._deps.pop()
+        if self._deps:
+            self._deps[-1].update(deps)
+        self._inst_deps[mod_inst_spec] = deps
         self._active_mod_insts.remove(mod_inst_spec)
+
+        if cache_key is not None and entry is None:
+            dep_digests = _dep_digests(deps)
+            if dep_digests is not None:
+                submodule_specs = [(inst.specs[0].name, inst.specs[1]) for inst in submodules]
+                self._cache.put(cache_key, (template, submodule_specs, dep_digests))
+
+        if self._module_template is not None:
+            key = (mod, hashlib.sha1(template.encode('utf-8')).digest(), tuple(submodules))
+            self._bodies[mod_inst_spec] = (key, cache_key, deps, [(decl, list(decl.defs)) for decl in deps if decl.kind == 'module'])
+            canonical = self._add_body(mod_inst_spec, key, mod_inst)
+            if canonical is not mod_inst:
+                return canonical
+        else:
+            self._name_module(mod_inst_spec, mod_inst)
+        if entry is not None:
+            mod_inst.template = template
+            mod_inst.submodules = submodules
+
+        if self._on_module is not None:
+            self._on_module(mod_inst)
+            mod_inst.decls = None
+            mod_inst.scope = None
+            mod_inst.template = None
+            mod_inst.submodules = None
+            self._shared.clear()
         return mod_inst
 
+    def _add_body(self, mod_inst_spec, key, mod_inst):
+        # Instances of a module whose parameters make no difference to
+        # their Verilog are emitted once; the first distinct body gets the
+        # module's name and the others are named after their args. The
+        # template is the same whether or not it came from the cache.
+        # Returns the instance that `mod_inst` is merged into, or itself.
+        canonical = self._module_bodies.get(key)
+        if canonical is None:
+            canonical = mod_inst
+            self._module_bodies[key] = mod_inst
+            self._name_module(mod_inst_spec, mod_inst)
+        self._modules[mod_inst_spec] = canonical
+        return canonical
+
+    def _name_module(self, mod_inst_spec, mod_inst):
+        mod = mod_inst.specs[0]
+        if mod in self._named_modules:
+            mod_inst.name = _inst_name(mod.name, mod_inst_spec[1])
+        else:
+            mod_inst.name = mod.name
+            self._named_modules.add(mod)
+
+    def _reuse_module(self, mod_inst_spec):
+        # Returns the instance from the previous build, or None if one of
+        # the declarations that it depends on changed since.
+        key, cache_key, deps, mod_defs = self._previous_bodies[mod_inst_spec]
+        for decl in deps:
+            if self.root_scope.lookup(decl.name, decl.kind) is not decl:
+                return None
+        for mod, defs in mod_defs:
+            if mod.defs != defs:
+                return None
+
+        # Its submodules are reused in turn, and are the ones that its
+        # decls refer to unless their bodies were merged differently.
+        self._active_mod_insts.add(mod_inst_spec)
+        self._deps.append(set())
+        for decl in deps:
+            self._touch(decl)
+        submodules = tuple(self._instantiate_module(inst.specs[0], inst.specs[1]) for inst in key[2])
+        self._deps.pop()
+        if self._deps:
+            self._deps[-1].update(deps)
+        self._active_mod_insts.remove(mod_inst_spec)
+        if submodules != key[2]:
+            return None
+
+        mod_inst = self._previous_modules[mod_inst_spec]
+        if mod_inst.template is None and cache_key is not None and self._cache is not None:
+            # Filling in the cached template is cheaper than formatting
+            # the decls again.
+            entry = self._cache.get(cache_key)
+            if entry is not None:
+                mod_inst.template = entry[0]
+                mod_inst.submodules = list(submodules)
+        self._inst_deps[mod_inst_spec] = deps
+        self._bodies[mod_inst_spec] = key, cache_key, deps, mod_defs
+        self.reused_modules += 1
+        return self._add_body(mod_inst_spec, key, mod_inst)
+
+    def _cached_module(self, key):
+        # -> (template, submodule specs, declarations) or None
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        template, submodule_specs, dep_digests = entry
+        decls = []
+        for kind, name, digest in dep_digests:
+            decl = self.root_scope.lookup(name, kind)
+            if decl is None or decl.kind != kind or _decl_digest(decl) != digest:
+                self.stale_modules += 1
+                return None
+            decls.append(decl)
+        self.cached_modules += 1
+        return template, submodule_specs, decls
+
     def instantiate_intf(self, scope, intf_name, args):
-        intf = self._root_scope.lookup(intf_name, 'interface')
+        intf = self.root_scope.lookup(intf_name, 'interface')
         if intf is None:
             raise RuntimeError('unknown interface: ' + intf_name)
+        self._touch(intf)
 
         arg_values = self._match_args(scope, intf.params, args)
 
@@ -122,12 +633,18 @@ class Context:
             raise RuntimeError('recursive instantiation')
 
         if intf_inst_spec in self._intfs:
+            self._add_deps(intf_inst_spec)
             return self._intfs[intf_inst_spec]
 
         intf_inst = Node('intf-inst', specs=(intf, tuple(arg_values)))
         self._intfs[intf_inst_spec] = intf_inst
         self._active_intf_insts.add(intf_inst_spec)
+        self._deps.append(set([intf]))
         self._inst_intf(intf_inst)
+        deps = self._deps.pop()
+        if self._deps:
+            self._deps[-1].update(deps)
+        self._inst_deps[intf_inst_spec] = deps
         self._active_intf_insts.remove(intf_inst_spec)
         return intf_inst
 
@@ -150,6 +667,18 @@ class Context:
 
         return arg_values
 
+    def _intern_type(self, kind, **attrs):
+        # Resolved types are hash-consed: structurally equal types are
+        # the same object and can be compared with `is`. Node-valued
+        # attributes are themselves interned types or declarations,
+        # which hash by identity.
+        key = (kind,) + tuple(sorted(attrs.items()))
+        r = self._types.get(key)
+        if r is None:
+            r = Node(kind, **attrs)
+            self._types[key] = r
+        return r
+
     def _inst_type(self, scope, type):
         if type.kind == 'struct-type':
             type_decl = scope.lookup(type.name)
@@ -157,28 +686,33 @@ class Context:
                 raise RuntimeError('expected type')
             if type_decl.kind == 'interface':
                 type_decl = self.instantiate_intf(scope, type.name, type.args)
-                return Node('intf-inst-type', decl=type_decl)
+                return self._intern_type('intf-inst-type', decl=type_decl)
             elif type_decl.kind == 'enum':
-                return Node('enum-type', decl=type_decl)
+                self._touch(type_decl)
+                return self._intern_type('enum-type', decl=type_decl)
             else:
                 raise RuntimeError('invalid type')
         if type.kind == 'array-type':
             subtype = self._inst_type(scope, type.subtype)
             lb = eval_int_expr(scope, type.left_bound)
             rb = eval_int_expr(scope, type.right_bound)
-            return Node('resolved-array-type', subtype=subtype, left_bound=lb, right_bound=rb)
+            return self._intern_type('resolved-array-type', subtype=subtype, left_bound=lb, right_bound=rb)
+        if type.kind == 'bit-type':
+            return self._intern_type('bit-type')
+        if type.kind == 'set-type':
+            self._touch(type.decl)
+            return self._intern_type('set-type', enum=type.enum, decl=type.decl)
         return type
 
-    def _make_arg_scope(self, params, args):
-        assert len(params) == len(args)
-        r = Scope(parent=self._root_scope)
-        for (param_name, param_type), arg in zip(params, args):
-            r.add(param_name, Node('num', value=arg))
-        return r
+    def _make_arg_scope(self, decl, args):
+        assert len(decl.params) == len(args)
+        values = [Node('num', value=arg) for arg in args]
+        values.extend([None] * (len(decl.symbols) - len(values)))
+        return Frame(decl.symbols, values, self.root_scope, tuple(args), self._int_exprs)
 
     def _inst_intf(self, intf_inst):
         intf, args = intf_inst.specs
-        scope = self._make_arg_scope(intf.params, args)
+        scope = self._make_arg_scope(intf, args)
 
         ports = []
         for decl in intf.decls:
@@ -189,55 +723,91 @@ class Context:
                 for port in intf.ports:
                     ports.append(Node('port', dir=port.dir, name=port.name, type=port.type))
         intf_inst.ports = ports
+        intf_inst.ports_by_name = _index_ports(ports)
 
-    def _inst_module(self, mod_inst):
+    def _inst_ports(self, mod_inst):
         mod, args = mod_inst.specs
-        scope = self._make_arg_scope(mod.params, args)
+        scope = self._make_arg_scope(mod, args)
 
         ports = []
         for port in mod.ports:
             port = Node('port', dir=port.dir, name=port.name, type=self._inst_type(scope, port.type))
-            scope.add(port.name, port)
+            scope.set(port.name, port)
             ports.append(port)
 
         mod_inst.scope = scope
         mod_inst.ports = ports
+        mod_inst.ports_by_name = _index_ports(ports)
+        return scope
+
+    def _inst_module(self, mod_inst):
+        mod, args = mod_inst.specs
+        scope = self._inst_ports(mod_inst)
 
         new_decls = []
         for mod_def in mod.defs:
-            def_scope = Scope(parent=scope)
+            def_scope = scope.extend(mod_def.symbols)
+            def_insts = []
             for decl in mod_def.decls:
                 if decl.kind == 'signal':
                     new_decl = Node('signal', name=decl.name, type=self._inst_type(scope, decl.type))
-                    def_scope.add(decl.name, new_decl)
+                    def_scope.set(decl.name, new_decl)
                     new_decls.append(new_decl)
                 elif decl.kind == 'inst':
-                    inst_mod = self.instantiate_module(scope, decl.module, []) # XXX: module should have args
-                    new_decl = Node('inst-inst', name=decl.name, module=inst_mod, specs=decl, type=Node('module-inst-type', decl=inst_mod))
-                    def_scope.add(decl.name, new_decl)
+                    inst_mod = self.instantiate_module(def_scope, decl.module, decl.args)
+                    new_decl = Node('inst-inst', name=decl.name, module=inst_mod, specs=decl, type=self._intern_type('module-inst-type', decl=inst_mod))
+                    def_scope.set(decl.name, new_decl)
                     new_decls.append(new_decl)
+                    def_insts.append(new_decl)
                 else:
                     assert decl.kind in ('always', 'on')
 
-            for inst in new_decls:
-                if inst.kind != 'inst-inst':
-                    continue
+            for inst in def_insts:
                 new_pms = []
                 for pm in inst.specs.port_maps:
                     target = self._inst_target_port_expr(inst.module, pm.target)
-                    new_pms.append(Node('port_map', target=target, source=self._inst_expr(def_scope, pm.source)))
+                    new_pms.append(Node('port_map', target=target, source=self._inst_shared(def_scope, pm.source, self._inst_expr)))
                 inst.port_maps = new_pms
 
             for decl in mod_def.decls:
                 if decl.kind == 'always':
-                    new_decls.append(Node('always', body=self._inst_stmts(def_scope, decl.body)))
+                    new_decls.append(Node('always', body=self._inst_shared_stmts(def_scope, decl.body)))
                 elif decl.kind == 'on':
-                    new_decls.append(Node('on', specs=decl.specs, body=self._inst_stmts(def_scope, decl.body)))
+                    new_decls.append(Node('on', specs=decl.specs, body=self._inst_shared_stmts(def_scope, decl.body)))
                 else:
                     assert decl.kind in ('signal', 'inst')
 
         mod_inst.decls = new_decls
 
+    def _inst_shared(self, scope, node, inst):
+        """
+        Returns `inst(scope, node)`, reusing the result of an earlier call
+        if the values of all slots that `node` refers to were equivalent.
+
+        The elaborated form of a statement or expression depends only on
+        those values, so module instances whose parameters do not affect
+        it share a single copy. The refs in a shared copy point to the
+        declarations of the instance that elaborated it first, which are
+        equivalent to those of the others; elaborated nodes must therefore
+        not be modified in place.
+        """
+        slots = self._ref_slots.get(node)
+        if slots is None:
+            slots = _ref_slots(node)
+            self._ref_slots[node] = slots
+        key = (node,) + tuple(_slot_key(scope.get(slot)) for slot in slots)
+        r = self._shared.get(key)
+        if r is not None:
+            r, size = r
+            self.shared_nodes += size
+            return r
+        r = inst(scope, node)
+        self._shared[key] = r, sum(1 for _ in _walk([r]))
+        return r
+
+    def _inst_shared_stmts(self, scope, stmts):
+        return [self._inst_shared(scope, stmt, self._inst_stmt) for stmt in stmts]
+
     def _inst_stmts(self, scope, stmts):
         return [self._inst_stmt(scope, stmt) for stmt in stmts]
 
@@ -249,22 +819,28 @@ class Context:
             if rhs.type.kind == 'atom-type':
                 assert rhs.kind == 'atom'
                 if lhs.type.kind == 'enum-type':
-                    index = lhs.type.decl.enumers.index(rhs.name)
+                    index = lhs.type.decl.enumer_indexes.get(rhs.name)
+                    if index is None:
+                        raise RuntimeError('invalid enumerator: ' + rhs.name)
                     rhs = Node('enum-expr', value_index=index, type=lhs.type)
                 elif lhs.type.kind == 'intf-inst-type':
                     if rhs.name != 'x':
                         raise RuntimeError('you can only assign \'x to a structure')
-                    rhs = Node('x-expr', type=Node('x-type'))
+                    rhs = Node('x-expr', type=self._x_type)
                 else:
                     raise RuntimeError('unsupported yet')
             elif rhs.type.kind == 'set-lit-type':
                 assert rhs.kind == 'set-expr'
                 if lhs.type.kind != 'set-type':
                     raise RuntimeError('type mismatch')
-                v = ['0']*len(lhs.type.decl.enumers)
+                enumer_indexes = lhs.type.decl.enumer_indexes
+                value = 0
                 for item in rhs.items:
-                    v[lhs.type.decl.enumers.index(item)] = '1'
-                rhs = Node('sized-num', size=len(v), v=''.join(v[::-1]), type=Node('int-type'))
+                    index = enumer_indexes.get(item)
+                    if index is None:
+                        raise RuntimeError('invalid enumerator: ' + item)
+                    value |= 1 << index
+                rhs = Node('sized-num', size=len(lhs.type.decl.enumers), value=value, xmask=0, zmask=0, type=self._int_type)
 
             return Node('assign-stmt', lhs=lhs, rhs=rhs, delayed=stmt.delayed)
         elif stmt.kind == 'if-stmt':
@@ -285,10 +861,8 @@ class Context:
 
     def _inst_target_port_expr(self, mod_inst, expr):
         if expr.kind == 'ref':
-            for port in mod_inst.ports:
-                if port.name == expr.name:
-                    break
-            else:
+            port = mod_inst.ports_by_name.get(expr.name)
+            if port is None:
                 raise RuntimeError('invalid port name')
             return Node('ref', name=expr.name, decl=port, type=port.type)
 
@@ -296,7 +870,10 @@ class Context:
         if expr.kind == 'binary-expr':
             lhs = self._inst_expr(scope, expr.lhs)
             rhs = self._inst_expr(scope, expr.rhs)
-            return Node('binary-expr', lhs=lhs, rhs=rhs, op=expr.op, type=Node('arith-type'))
+            r = Node('binary-expr', lhs=lhs, rhs=rhs, op=expr.op, type=self._arith_type)
+            if getattr(expr, '_regrouped', False):
+                r._regrouped = True
+            return r
         elif expr.kind == 'unary-expr':
             arg = self._inst_expr(scope, expr.arg)
             return Node('unary-expr', arg=arg, op=expr.op, type=arg.type)
@@ -308,10 +885,8 @@ class Context:
             e = self._inst_expr(scope, expr.expr)
             if e.type.kind not in ('intf-inst-type', 'module-inst-type'):
                 raise RuntimeError('member access on non-interface')
-            for port in e.type.decl.ports:
-                if expr.member == port.name:
-                    break
-            else:
+            port = e.type.decl.ports_by_name.get(expr.member)
+            if port is None:
                 raise RuntimeError('non-existent member')
             return Node('member-expr', expr=e, member=expr.member, decl=port, type=port.type)
         elif expr.kind == 'slice-expr':
@@ -326,14 +901,14 @@ class Context:
                 lower_bound, upper_bound = upper_bound, lower_bound
             if not lower_bound <= lb <= upper_bound or not lower_bound <= rb <= upper_bound:
                 raise RuntimeError('invalid slice bounds')
-            t = Node('resolved-array-type', subtype=e.type.subtype, left_bound=lb, right_bound=rb)
+            t = self._intern_type('resolved-array-type', subtype=e.type.subtype, left_bound=lb, right_bound=rb)
             return Node('slice-expr', expr=e, lower_bound=lb, upper_bound=rb, type=t)
         elif expr.kind == 'subscript-expr':
             e = self._inst_expr(scope, expr.expr)
             if e.type.kind != 'resolved-array-type':
                 raise RuntimeError('only arrays can be subscripted')
             index = self._inst_expr(scope, expr.index)
-            if index.type != 'int-type':
+            if index.type is not self._int_type:
                 raise RuntimeError('array subscripts must be integers')
             return Node('subscript-expr', expr=e, index=index, type=e.type.subtype)
         #elif expr.kind == 'call-expr':
@@ -341,15 +916,18 @@ class Context:
         #    args = [self._inst_expr(scope, arg) for arg in expr.args]
         #    return Node('call-expr', fn=fn, args=args)
         elif expr.kind == 'ref':
-            decl = scope.lookup(expr.name)
+            slot = getattr(expr, 'slot', None)
+            decl = scope.get(slot) if slot is not None else scope.lookup(expr.name)
+            if decl is None:
+                raise RuntimeError('unknown name: ' + expr.name)
             return Node('ref', name=expr.name, decl=decl, type=decl.type)
         elif expr.kind == 'atom':
-            return Node('atom', name=expr.name, type=Node('atom-type'))
+            return Node('atom', name=expr.name, type=self._atom_type)
         elif expr.kind == 'num':
-            return Node('num', value=expr.value, type=Node('int-type'))
+            return Node('num', value=expr.value, type=self._int_type)
         elif expr.kind == 'sized-num':
-            return Node('sized-num', size=expr.size, v=expr.v, type=Node('int-type'))
+            return Node('sized-num', size=expr.size, value=expr.value, xmask=expr.xmask, zmask=expr.zmask, type=self._int_type)
         elif expr.kind == 'set-expr':
-            return Node('set-expr', items=expr.items, type=Node('set-lit-type'))
+            return Node('set-expr', items=expr.items, type=self._set_lit_type)
         else:
             raise RuntimeError('invalid expr')
@@ -0,0 +1,202 @@
+"""
+A compile server that keeps parsed files and generated modules in memory,
+so that repeated runs of `bv` pay neither the interpreter startup nor the
+parsing and elaboration of what did not change since the previous run.
+
+The server listens on a Unix socket or on its stdin and stdout. Each
+request and each response is a JSON object on a line of its own; the
+`id` of a request, if any, is copied to its response.
+
+ * {"op": "run", "args": [str], "cwd": str}
+    runs `bv` with the command-line `args`, whose relative paths are
+    relative to the directory `cwd`, the server's own by default; the
+    response holds the `status`, `stdout` and `stderr` of the run.
+    Modules are selected with `-m`, which may be repeated and may carry
+    arguments, as in "-m fifo(4, 8)".
+ * {"op": "check", "files": [str], "library": [str], "cwd": str}
+    parses `files`, loading declarations from `library` as -L does, both
+    relative to `cwd` as in "run", and elaborates their modules without
+    parameters, but generates nothing; the response's `errors` is a list
+    of objects with a `message` and, for parse errors, the `file`, `line`
+    and `col`.
+
+An exception that the translator does not raise for faulty input, as
+a bug would, fails the request instead; the response holds its traceback
+as `error`.
+
+Clients are served concurrently, but their requests are run one at
+a time on a worker thread, since they share the cached syntax trees.
+"""
+import argparse, asyncio, concurrent.futures, contextlib, glob, io, json, os, sys, traceback
+from .__main__ import main as bv_main, _glob
+from .cache import MemoryCache
+from .gen_verilog import module_template
+from .index import DeclIndex
+from .lexer import ParseError
+from .parser import parse_file
+from .sema import sema, Context
+
+# Requests may carry long argument lists.
+_line_limit = 1 << 24
+
+# The in-memory caches are swept after this many requests, dropping what
+# none of them used.
+_sweep_interval = 64
+
+def _parse_error(e):
+    return { 'file': e.fname, 'line': e.line, 'col': e.col, 'message': e.msg }
+
+class Server:
+    """
+    Holds the caches shared by the requests. A run given --cache-dir uses
+    that directory instead and leaves them alone.
+    """
+    def __init__(self):
+        self.cache = MemoryCache()
+        self.module_cache = MemoryCache()
+        self.requests = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._ops = {
+            'run': self._run,
+            'check': self._check,
+            }
+
+    def handle(self, request):
+        """
+        Runs the decoded `request` and returns the response.
+        """
+        op = self._ops.get(request.get('op'))
+        if op is None:
+            r = { 'error': 'unknown op: {}'.format(request.get('op')) }
+        else:
+            try:
+                r = op(request, request.get('cwd', os.getcwd()))
+            except Exception:
+                r = { 'error': traceback.format_exc() }
+
+        self.requests += 1
+        if self.requests % _sweep_interval == 0:
+            self.cache.sweep()
+            self.module_cache.sweep()
+
+        if 'id' in request:
+            r['id'] = request['id']
+        return r
+
+    def _run(self, request, cwd):
+        out = io.StringIO()
+        err = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                status = bv_main(request['args'], stdout=out, caches=(self.cache, self.module_cache), cwd=cwd)
+            except SystemExit as e:
+                status = e.code
+                if not isinstance(status, int):
+                    if status is not None:
+                        err.write('{}\n'.format(status))
+                    status = 0 if status is None else 1
+            except (RuntimeError, ParseError, IOError) as e:
+                err.write('error: {}\n'.format(e))
+                status = 1
+        return { 'status': status or 0, 'stdout': out.getvalue(), 'stderr': err.getvalue() }
+
+    def _check(self, request, cwd):
+        errors = []
+        units = []
+        for fname in request.get('files', ()):
+            try:
+                units.append(parse_file(os.path.join(cwd, fname), cache=self.cache))
+            except ParseError as e:
+                # Reported under the name the client knows the file by.
+                error = _parse_error(e)
+                error['file'] = fname
+                errors.append(error)
+            except IOError as e:
+                errors.append({ 'file': fname, 'message': str(e) })
+        if errors:
+            return { 'errors': errors }
+
+        try:
+            index = None
+            if request.get('library'):
+                index = DeclIndex(cache=self.cache)
+                for pattern in request['library']:
+                    for fname in sorted(_glob(os.path.join(glob.escape(cwd), pattern))):
+                        index.add_file(fname)
+            root_scope = sema(units, index=index)
+            ctx = Context(units, root_scope, cache=self.module_cache, module_template=module_template)
+            for name, entity in list(root_scope.items()):
+                if entity.kind == 'module' and not entity.params:
+                    ctx.instantiate_module(root_scope, name, ())
+        except ParseError as e:
+            errors.append(_parse_error(e))
+        except (RuntimeError, IOError) as e:
+            errors.append({ 'message': str(e) })
+        return { 'errors': errors }
+
+    async def serve_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line.decode('utf-8'))
+                    if not isinstance(request, dict):
+                        raise ValueError('not an object')
+                except ValueError as e:
+                    r = { 'error': 'invalid request: {}'.format(e) }
+                else:
+                    r = await loop.run_in_executor(self._executor, self.handle, request)
+                writer.write((json.dumps(r) + '\n').encode('utf-8'))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_unix(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        server = await asyncio.start_unix_server(self.serve_client, path, limit=_line_limit)
+        try:
+            await server.serve_forever()
+        finally:
+            server.close()
+            os.remove(path)
+
+    async def serve_stdio(self):
+        # The responses go to the original stdout; runs see a redirected one.
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=_line_limit)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        await self.serve_client(reader, writer)
+
+def main(args=None):
+    p = argparse.ArgumentParser(prog='bv-server')
+    p.add_argument('--socket', default=os.environ.get('BV_SERVER'),
+        help='path of the Unix socket to listen on (default: $BV_SERVER)')
+    p.add_argument('--stdio', action='store_true',
+        help='serve a single client on stdin and stdout instead of a socket')
+    args = p.parse_args(args=args)
+
+    if not args.stdio and not args.socket:
+        p.error('either --socket or --stdio is required')
+
+    server = Server()
+    if args.stdio:
+        coro = server.serve_stdio()
+    else:
+        coro = server.serve_unix(args.socket)
+    try:
+        asyncio.run(coro)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    sys.exit(main())
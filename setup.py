@@ -14,10 +14,11 @@ setup(
     license='MIT',
 
     packages=['better_verilog'],
-    install_requires=['speg'],
     entry_points = {
         'console_scripts': [
-            'bv = better_verilog.__main__:main'
+            'bv = better_verilog.__main__:main',
+            'bvc = better_verilog.client:main',
+            'bv-server = better_verilog.client:server_main',
         ],
     }
 )
@@ -0,0 +1,18 @@
+module chains(
+    input[7:0] a,
+    input[7:0] b,
+    output reg[7:0] s,
+    output reg[7:0] t,
+    output reg[7:0] v,
+    output reg[7:0] u
+    );
+
+always @(*) begin
+    s = a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b + a - b;
+    t = a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b - a - b;
+    u = a;
+    v = a - b - a - (b - a) + (a + b) - b * a - a - (b + a) - b + a - (a - b) - b + (b - a - b) - a;
+end
+
+endmodule
+
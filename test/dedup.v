@@ -0,0 +1,43 @@
+module top(
+    input clk,
+    output reg[7:0] a__data,
+    output reg a__valid,
+    output reg[7:0] b__data,
+    output reg b__valid
+    );
+
+wire[7:0] m1__s__data;
+wire m1__s__valid;
+m m1(
+    .s__data(m1__s__data),
+    .s__valid(m1__s__valid),
+    .clk(clk)
+    );
+
+wire[7:0] m2__s__data;
+wire m2__s__valid;
+m m2(
+    .s__data(m2__s__data),
+    .s__valid(m2__s__valid),
+    .clk(clk)
+    );
+
+always @(*) begin
+    a = m1__s;
+    b = m2__s;
+end
+
+endmodule
+
+module m(
+    input clk,
+    output reg[7:0] s__data,
+    output reg s__valid
+    );
+
+always @(posedge clk) begin
+    s__valid <= 1;
+end
+
+endmodule
+
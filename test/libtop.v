@@ -0,0 +1,59 @@
+module top(
+    input clk,
+    input rst,
+    input[7:0] a,
+    output reg[7:0] b,
+    output reg[7:0] s__data,
+    output reg s__valid,
+    input s__ready,
+    output reg[1:0] st,
+    output reg[2:0] m
+    );
+
+reg[7:0] r;
+
+wire[3:0] c__y;
+child c(
+    .y(c__y),
+    .x(a[3:0])
+    );
+
+always @(posedge clk) begin
+    if (rst) begin
+        r <= 0;
+        st <= 2'd0;
+    end else begin
+        r <= a ^ r & 8'b10100101;
+        st <= 2'd1;
+    end
+    casez (r)
+        8'b00000001: begin
+            b <= c__y;
+        end
+        8'b000000?0: begin
+            b <= r;
+        end
+    endcase
+    m <= 3'b101;
+end
+
+always @(*) begin
+    s__data[7:0] = 1'sbx;
+    s__valid = 1'sbx;
+    s__ready = 1'sbx;
+end
+
+endmodule
+
+module child(
+    input clk,
+    input[3:0] x,
+    output reg[3:0] y
+    );
+
+always @(*) begin
+    y = x;
+end
+
+endmodule
+
@@ -0,0 +1,82 @@
+module top(
+    input clk,
+    input[7:0] a,
+    output reg[7:0] b,
+    output reg[3:0] c
+    );
+
+wire[7:0] f1__q;
+fifo f1(
+    .q(f1__q),
+    .clk(clk),
+    .d(a)
+    );
+
+wire[3:0] f2__q;
+fifo__4_4 f2(
+    .q(f2__q),
+    .clk(clk),
+    .d(a[3:0])
+    );
+
+wire[7:0] r1__q;
+dff r1(
+    .q(r1__q),
+    .clk(clk),
+    .d(f1__q)
+    );
+
+wire[7:0] r2__q;
+dff r2(
+    .q(r2__q),
+    .clk(clk),
+    .d(r1__q)
+    );
+
+always @(*) begin
+    b = r2__q;
+    c = f2__q;
+end
+
+endmodule
+
+module fifo(
+    input clk,
+    input[7:0] d,
+    output reg[7:0] q
+    );
+
+reg[15:0] mem;
+
+always @(posedge clk) begin
+    q <= mem[7:0];
+end
+
+endmodule
+
+module fifo__4_4(
+    input clk,
+    input[3:0] d,
+    output reg[3:0] q
+    );
+
+reg[15:0] mem;
+
+always @(posedge clk) begin
+    q <= mem[3:0];
+end
+
+endmodule
+
+module dff(
+    input clk,
+    input[7:0] d,
+    output reg[7:0] q
+    );
+
+always @(posedge clk) begin
+    q <= d;
+end
+
+endmodule
+
@@ -1,27 +1,424 @@
-from better_verilog.__main__ import main as bv_main
-import sys, os.path
+from better_verilog.__main__ import main as bv_main, _build, _find_inputs
+from better_verilog.client import server_main
+from better_verilog.parser import parse_text, parse_files
+from better_verilog.sema import sema, Context
+from better_verilog import cache, gen_verilog
+from better_verilog.index import DeclIndex
+import sys, os, os.path, glob, shutil, tempfile, multiprocessing, argparse
 
 try:
     from StringIO import StringIO
 except:
     from io import StringIO
 
+def run(args):
+    out = StringIO()
+    r = bv_main(args, stdout=out)
+    if r:
+        raise RuntimeError('failed: {}: {}'.format(' '.join(args), r))
+    return out.getvalue()
+
+def run_pools(args):
+    """
+    Returns the output of `run(args)` and the number of process pools
+    that Verilog generation started.
+    """
+    pools = []
+    fork_pool = gen_verilog._fork_pool
+    def counting_pool(processes):
+        pools.append(processes)
+        return fork_pool(processes)
+    gen_verilog._fork_pool = counting_pool
+    try:
+        return run(args), len(pools)
+    finally:
+        gen_verilog._fork_pool = fork_pool
+
+def split_modules(text):
+    return sorted(part.strip() for part in text.split('endmodule\n'))
+
+def read_depfile(fname):
+    with open(fname, 'r') as fin:
+        return set(fin.read().replace('\\\n', ' ').split()[1:])
+
+def check_nesting(depth):
+    """
+    Parses an expression nested `depth` parentheses deep, which must not
+    run out of stack.
+    """
+    src = 'module m:\n    o y\n\ndef m:\n    always:\n        y = {}y{}\n'.format('(' * depth, ')' * depth)
+    parse_text(src)
+
+duplicates = [
+    # A signal declared twice in one def.
+    'module m:\n    o y\n\ndef m:\n    sig t\n    sig t\n    always:\n        y = t\n',
+    # A signal with the name of a port.
+    'module m:\n    i y\n\ndef m:\n    sig y\n',
+    # A parameter with the name of a port.
+    'module m(y):\n    o y\n',
+    ]
+
+def check_duplicates():
+    """
+    Returns the first of `duplicates` that is not reported, or None.
+    """
+    for src in duplicates:
+        try:
+            sema([parse_text(src)])
+        except RuntimeError as e:
+            if str(e) != 'duplicate declaration: ' + ('t' if 'sig t' in src else 'y'):
+                return src
+        else:
+            return src
+
+def _put_entries(args):
+    path, n = args
+    disk_cache = cache.DiskCache(path)
+    for i in range(n):
+        disk_cache.put(cache.DiskCache.key('shared'), [i] * 10000)
+        value = disk_cache.get(cache.DiskCache.key('shared'))
+        if value is None or len(value) != 10000 or len(set(value)) != 1:
+            return False
+    return True
+
+def check_disk_cache(tmp_dir):
+    """
+    Checks that the least recently used entries are evicted once the cache
+    grows past its size, and that processes sharing a cache never read an
+    entry that another one is writing. Returns what failed, or None.
+    """
+    path = os.path.join(tmp_dir, 'lru')
+    disk_cache = cache.DiskCache(path, max_size=1 << 20)
+    keys = [cache.DiskCache.key(str(i)) for i in range(4)]
+    for i, key in enumerate(keys[:3]):
+        disk_cache.put(key, b'x' * (300 << 10))
+        os.utime(disk_cache._entry_path(key), (1000 + i, 1000 + i))
+
+    # Reading the oldest entry makes the second one the least recently used.
+    disk_cache.get(keys[0])
+    disk_cache.put(keys[3], b'x' * (300 << 10))
+    if [disk_cache.get(key) is not None for key in keys] != [True, False, True, True]:
+        return 'lru eviction'
+    if disk_cache._evict() > disk_cache.max_size:
+        return 'size limit'
+
+    # A hit on an entry whose mtime cannot be refreshed is still a hit.
+    utime = cache.os.utime
+    def fail(*args):
+        raise OSError('read-only')
+    cache.os.utime = fail
+    try:
+        hits = disk_cache.hits
+        if disk_cache.get(keys[0]) is None or disk_cache.hits != hits + 1:
+            return 'read-only hit'
+    finally:
+        cache.os.utime = utime
+
+    path = os.path.join(tmp_dir, 'shared')
+    pool = multiprocessing.Pool(4)
+    try:
+        if not all(pool.map(_put_entries, [(path, 50)] * 4)):
+            return 'shared writes'
+    finally:
+        pool.close()
+        pool.join()
+    for dir, dirnames, fnames in os.walk(path):
+        if any(fname.startswith('.tmp') for fname in fnames):
+            return 'leftover temporary files'
+
+class ChunkRecorder(object):
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+
+def check_library(fname, lib):
+    """
+    Elaborates the tops of `fname` with the library files matching `lib`
+    and returns the names of the library declarations that were loaded.
+    """
+    index = DeclIndex()
+    for lib_fname in glob.glob(lib):
+        index.add_file(lib_fname)
+    units = parse_files([fname])
+    root_scope = sema(units, index=index)
+    ctx = Context(units, root_scope)
+    for name, entity in list(root_scope.items()):
+        if entity.kind == 'module' and not entity.params:
+            ctx.instantiate_module(root_scope, name, ())
+    return sorted((decl.kind, decl.name) for unit in index.units.values() for decl in unit.decls)
+
+watch_sources = {
+    'top.bv': 'module top:\n    i a\n    o b\n    o c\n\ndef top:\n    inst x: child\n        a <= a\n    inst y: other\n        a <= a\n    always:\n        b = x.b\n        c = y.b\n',
+    'child.bv': 'module child:\n    i a\n    o b\n\ndef child:\n    always:\n        b = a\n',
+    'other.bv': 'module other:\n    i a\n    o b\n\ndef other:\n    always:\n        b = not a\n',
+    }
+
+def check_watch(tmp_dir):
+    """
+    Builds a design twice as --watch does, with an edit of one module in
+    between, and checks that the second build reuses the instances that
+    did not change and rewrites only the edited module. Returns what
+    failed, or None.
+    """
+    src_dir = os.path.join(tmp_dir, 'src')
+    os.makedirs(src_dir)
+    for fname, text in watch_sources.items():
+        with open(os.path.join(src_dir, fname), 'w') as fout:
+            fout.write(text)
+    file_list = os.path.join(tmp_dir, 'files.txt')
+    with open(file_list, 'w') as fout:
+        fout.write('src/top.bv\nsrc/child.bv\n')
+
+    out_dir = os.path.join(tmp_dir, 'out')
+    args = argparse.Namespace(file_list=[file_list], print_ast=False, jobs=1, split=False, stream=False,
+        module=[], depfile=None, out_dir=out_dir)
+    caches = cache.MemoryCache(), cache.MemoryCache()
+    known = {}
+    def build(previous):
+        _find_inputs(args, [os.path.join(src_dir, 'o*.bv')], [])
+        files = gen_verilog.ModuleFiles(out_dir, known=known)
+        ctx = _build(args, StringIO(), caches[0], caches[1], files, previous=previous)
+        return ctx, files
+
+    ctx, files = build(None)
+    if files.written != 3:
+        return 'first build'
+
+    with open(os.path.join(src_dir, 'other.bv'), 'w') as fout:
+        fout.write(watch_sources['other.bv'].replace('not a', 'a'))
+    mtimes = dict((fname, os.path.getmtime(fname)) for fname in files.fnames)
+    for fname in files.fnames:
+        os.utime(fname, (0, 0))
+    previous = ctx
+    ctx, files = build(previous)
+    if ctx.root_scope is not previous.root_scope:
+        return 'the declarations were not updated in place'
+    if ctx.reused_modules != 1:
+        return 'reused {} modules'.format(ctx.reused_modules)
+    changed = sorted(os.path.basename(fname) for fname in files.fnames if os.path.getmtime(fname) != 0)
+    if changed != ['other.v']:
+        return 'rewrote {}'.format(', '.join(changed))
+
+    with open(os.path.join(out_dir, 'other.v'), 'r') as fin:
+        if 'b = a;' not in fin.read():
+            return 'edit not built'
+
+def check_chunks(args, exp):
+    """
+    Runs `bv` on `args` and checks that statements are written a line at
+    a time and that no chunk spans more than a module header, an instance
+    or a module end. Returns the first chunk that does, or None.
+    """
+    out = ChunkRecorder()
+    bv_main(args, stdout=out)
+    if ''.join(out.chunks) != exp:
+        return 'incorrect output'
+    for chunk in out.chunks:
+        if chunk.count('\n') > 1 and ('begin' in chunk or chunk.count('module') > 1):
+            return chunk
+
+def check_stream(fname):
+    """
+    Elaborates the tops of `fname` as --stream does and checks that each
+    module is written after its submodules and released once written.
+    Returns what failed, or None.
+    """
+    units = parse_files([fname])
+    root_scope = sema(units)
+    written = []
+    failed = []
+    def on_module(mod_inst):
+        if any(inst.decls is not None or inst.scope is not None for inst in written):
+            failed.append('{} written before a module was released'.format(mod_inst.name))
+        for decl in mod_inst.decls:
+            if decl.kind == 'inst-inst' and decl.module not in written:
+                failed.append('{} written before {}'.format(mod_inst.name, decl.module.name))
+        written.append(mod_inst)
+    ctx = Context(units, root_scope, on_module=on_module, module_template=gen_verilog.module_template)
+    for name, entity in list(root_scope.items()):
+        if entity.kind == 'module' and not entity.params:
+            ctx.instantiate_module(root_scope, name, ())
+    if any(inst.decls is not None or inst.scope is not None for inst in written):
+        failed.append('a module was not released')
+    return failed[0] if failed else None
+
+def check_modes(name, args, fname, exp, tmp_dir):
+    """
+    Runs the design through the command-line modes that must not change
+    its output. Returns the failing mode, or None.
+    """
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    for mode in (['--cache-dir', cache_dir], ['--cache-dir', cache_dir]):
+        if run(mode + args + [fname]) != exp:
+            return ' '.join(mode)
+
+    # With several modules, -j generates them in a pool of workers, also
+    # when their templates come from the cache.
+    use_pool = hasattr(os, 'fork') and exp.count('endmodule\n') > 1
+    for mode in (['-j', '2'], ['-j', '2', '--split'], ['--cache-dir', cache_dir, '-j', '2']):
+        real, pools = run_pools(mode + args + [fname])
+        if real != exp or pools != (1 if use_pool else 0):
+            return ' '.join(mode)
+
+    file_list = os.path.join(tmp_dir, 'files.txt')
+    with open(file_list, 'w') as fout:
+        fout.write(os.path.abspath(fname) + '\n')
+    if run(args + ['-f', file_list]) != exp:
+        return '-f'
+
+    # Submodules are written before their parents.
+    if split_modules(run(['--stream'] + args + [fname])) != split_modules(exp):
+        return '--stream'
+
+    out_dir = os.path.join(tmp_dir, 'out')
+    depfile = os.path.join(tmp_dir, 'out.d')
+    for mode in (['-o', out_dir, '-MD', depfile], ['-o', out_dir, '--stream'], ['-o', out_dir, '-j', '2']):
+        real, pools = run_pools(mode + args + [fname])
+        if pools != (1 if use_pool and '-j' in mode else 0):
+            return ' '.join(mode[:1] + mode[2:])
+        with open(os.path.join(out_dir, 'files.f'), 'r') as fin:
+            out_files = fin.read().split()
+        text = ''
+        for out_file in out_files:
+            with open(out_file, 'r') as fin:
+                text += fin.read()
+        if split_modules(text) != split_modules(exp):
+            return ' '.join(mode[:1] + mode[2:])
+
+    # Files with unchanged content are not rewritten.
+    for out_file in out_files:
+        os.utime(out_file, (0, 0))
+    run(['-o', out_dir] + args + [fname])
+    if any(os.path.getmtime(out_file) != 0 for out_file in out_files):
+        return '-o, second run'
+
+    # Of the library files, only those whose declarations the design
+    # uses are listed; lib3.bv declares nothing that libtop uses.
+    deps = set([fname])
+    if '-L' in args:
+        deps.update(lib_fname for lib_fname in glob.glob(args[args.index('-L') + 1]) if os.path.basename(lib_fname) != 'lib3.bv')
+    if read_depfile(depfile) != deps:
+        return '-MD'
+    return None
+
 def main():
     this_dir = os.path.split(__file__)[0]
 
-    out = StringIO()
-    r = bv_main([os.path.join(this_dir, 'hello_world.bv')], stdout=out)
-    if r:
-        print('failed: {}'.format(r))
-        return r
-    with open(os.path.join(this_dir, 'hello_world.v'), 'r') as fin:
-        real = out.getvalue()
-        exp = fin.read()
-        if real != exp:
-            print('incorrect output')
-            print(real)
-            print(exp)
+    lib = os.path.join(this_dir, 'lib', '*.bv')
+    designs = [
+        ('hello_world', []),
+        ('features', []),
+        ('params', []),
+        ('chains', []),
+        ('libtop', ['-L', lib]),
+        ('dedup', []),
+        ]
+
+    for name, args in designs:
+        fname = os.path.join(this_dir, name + '.bv')
+        real = run(args + [fname])
+        with open(os.path.join(this_dir, name + '.v'), 'r') as fin:
+            exp = fin.read()
+            if real != exp:
+                print('incorrect output: {}'.format(name))
+                print(real)
+                print(exp)
+                return 1
+
+        chunk = check_chunks(args + [fname], exp)
+        if chunk is not None:
+            print('output not written a line at a time: {}: {}'.format(name, chunk))
+            return 1
+
+        if not args:
+            failed = check_stream(fname)
+            if failed is not None:
+                print('--stream: {}: {}'.format(name, failed))
+                return 1
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            mode = check_modes(name, args, fname, exp, tmp_dir)
+        finally:
+            shutil.rmtree(tmp_dir)
+        if mode is not None:
+            print('incorrect output: {} with {}'.format(name, mode))
+            return 1
+
+    check_nesting(100)
+
+    # Only the declarations that libtop uses are parsed; lib2.bv also
+    # declares a module with a syntax error.
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        failed = check_watch(tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir)
+    if failed is not None:
+        print('--watch: {}'.format(failed))
+        return 1
+
+    loaded = check_library(os.path.join(this_dir, 'libtop.bv'), lib)
+    if loaded != [('def', 'child'), ('enum', 'state'), ('interface', 'bus'), ('module', 'child')]:
+        print('incorrect library declarations loaded: {}'.format(loaded))
+        return 1
+
+    src = check_duplicates()
+    if src is not None:
+        print('duplicate declaration not reported:\n{}'.format(src))
+        return 1
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        failed = check_disk_cache(tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir)
+    if failed is not None:
+        print('disk cache: {}'.format(failed))
+        return 1
+
+    if sys.version_info >= (3, 7):
+        from better_verilog.server import Server
+        server = Server()
+        for name in ('hello_world', 'params', 'params'):
+            r = server.handle({ 'op': 'run', 'args': [os.path.join(this_dir, name + '.bv')] })
+            with open(os.path.join(this_dir, name + '.v'), 'r') as fin:
+                if r.get('stdout') != fin.read():
+                    print('incorrect server output: {}: {}'.format(name, r))
+                    return 1
+        r = server.handle({ 'op': 'run', 'args': ['-L', 'lib/*.bv', 'libtop.bv'], 'cwd': this_dir })
+        with open(os.path.join(this_dir, 'libtop.v'), 'r') as fin:
+            if r.get('stdout') != fin.read():
+                print('incorrect server output with cwd: {}'.format(r))
+                return 1
+        r = server.handle({ 'op': 'check', 'files': ['missing.bv'], 'cwd': this_dir })
+        if [error.get('file') for error in r.get('errors', ())] != ['missing.bv']:
+            print('unexpected server errors with cwd: {}'.format(r))
+            return 1
+        import better_verilog.server
+        def broken_sema(units, index=None):
+            raise KeyError('broken')
+        better_verilog.server.sema = broken_sema
+        try:
+            r = server.handle({ 'op': 'check', 'files': [os.path.join(this_dir, 'features.bv')] })
+        finally:
+            better_verilog.server.sema = sema
+        if 'KeyError' not in r.get('error', '') or 'Traceback' not in r['error']:
+            print('unexpected server response to a bug: {}'.format(r))
+            return 1
+        r = server.handle({ 'op': 'check', 'files': [os.path.join(this_dir, 'features.bv')], 'id': 1 })
+        if r != { 'errors': [], 'id': 1 }:
+            print('unexpected server errors: {}'.format(r))
+            return 1
+        r = server.handle({ 'op': 'check', 'files': [os.path.join(this_dir, 'libtop.bv')], 'library': [lib] })
+        if r != { 'errors': [] }:
+            print('unexpected server errors: {}'.format(r))
             return 1
+    elif server_main([]) != 1:
+        print('bv-server did not refuse to run')
+        return 1
     print('success')
 
 if __name__ == '__main__':